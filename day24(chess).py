@@ -1,21 +1,59 @@
 import pygame
 import chess
 import chess.engine
+import chess.pgn
+import chess.polyglot
+import chess.syzygy
 import random
+from collections import OrderedDict
 import os
 import datetime
 import json
 from pathlib import Path
 import threading
 import time
+import argparse
+import statistics
+import sys
+import base64
+import sqlite3
+import struct
+import itertools
+import multiprocessing.util
+import mmap
+import queue
+import zlib
+import uuid
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+import concurrent.futures
+import math
 
 pygame.init()
-pygame.mixer.init()
+try:
+    pygame.mixer.init()
+except pygame.error as e:
+    # No audio device (e.g. headless replays); the game has no sound effects yet
+    print(f"Audio unavailable: {e}")
 
 WIDTH = 1100
 HEIGHT = 750
 BOARD_SIZE = 750
-SQUARE_SIZE = BOARD_SIZE // 8
+PANEL_WIDTH = WIDTH - BOARD_SIZE
+MIN_WIDTH = 800
+MIN_HEIGHT = 600
+SIZE_CACHE_ENTRIES = 3  # Number of recent window sizes to keep rendered surfaces for
+
+# Event types captured by the input recorder and the attributes kept for each
+RECORDED_EVENTS = {
+    pygame.QUIT: (),
+    pygame.KEYDOWN: ('key', 'mod', 'unicode', 'scancode'),
+    pygame.KEYUP: ('key', 'mod', 'scancode'),
+    pygame.MOUSEBUTTONDOWN: ('pos', 'button'),
+    pygame.MOUSEBUTTONUP: ('pos', 'button'),
+    pygame.MOUSEMOTION: ('pos', 'rel', 'buttons'),
+    pygame.VIDEORESIZE: ('size', 'w', 'h'),
+}
 WHITE = (240, 217, 181)
 BROWN = (181, 136, 99)
 SELECTED_COLOR = (186, 202, 43)
@@ -26,6 +64,189 @@ MENU_BUTTON_COLOR = (70, 70, 70)
 MENU_BUTTON_HOVER = (90, 90, 90)
 MENU_TEXT_COLOR = (230, 230, 230)
 
+# Adjustable difficulty parameters
+DIFFICULTY_SETTINGS = [
+    {"Skill Level": 0, "Depth": 1, "Time": 0.1},   # Easy
+    {"Skill Level": 10, "Depth": 5, "Time": 0.5},  # Medium
+    {"Skill Level": 20, "Depth": 10, "Time": 1.0}  # Hard
+]
+
+# Time controls offered in the menu: (base seconds, increment seconds) or None for no clock
+TIME_CONTROLS = {
+    'clock_none': None,
+    'clock_blitz': (180, 2),
+    'clock_rapid': (600, 5),
+    'clock_classical': (1800, 20),
+}
+CLOCK_LOW_TIME_MS = 20000  # Show tenths of seconds below this
+
+# Set paths for different operating systems
+STOCKFISH_PATHS = {
+    'posix': './stockfish',       # Linux/Mac
+    'nt': './stockfish.exe',      # Windows
+    'fallback': 'stockfish'       # Try system PATH
+}
+
+# Syzygy endgame tablebases (optional). Tables are memory-mapped by python-chess
+# and at most SYZYGY_MAX_FDS table files are kept open at once (LRU).
+SYZYGY_PATH = os.environ.get('CHESS_SYZYGY_PATH', 'syzygy')
+SYZYGY_MAX_FDS = 32
+
+# Game archive: zlib-compressed JSON saves appended to one file, located through the index
+ARCHIVE_FILE = 'chess_games.archive'
+ARCHIVE_INDEX_FILE = 'chess_games.archive.idx'
+ARCHIVE_INDEX_ENTRY = struct.Struct('<QId')  # Byte offset, compressed length, save timestamp
+ARCHIVE_PREFIX = 'archive:'  # Names archive entries where a save file name is expected
+
+# Opening explorer index built from saved games and PGN journals
+EXPLORER_DB = 'chess_explorer.sqlite3'
+EXPLORER_MOVES_SHOWN = 4
+
+# Position navigation: a board snapshot is kept every SNAPSHOT_INTERVAL plies
+SNAPSHOT_INTERVAL = 8
+NAVIGATION_KEYS = {
+    pygame.K_HOME: 'first',
+    pygame.K_LEFT: 'prev',
+    pygame.K_RIGHT: 'next',
+    pygame.K_END: 'last',
+    pygame.K_BACKSPACE: 'takeback',
+}
+
+# Moves queued by the player during the computer's turn
+PREMOVE_COLOR = (205, 110, 95)
+
+# Speculative hint search on the player's turn
+HINT_DEPTH = 20
+HINT_ARROW_COLOR = (60, 120, 220)
+
+# Puzzle mining
+PUZZLE_FILE = 'chess_puzzles.jsonl'
+PUZZLE_INDEX_FILE = 'chess_puzzles.idx'  # Little-endian uint64 byte offsets into PUZZLE_FILE
+PUZZLE_MIN_PLY = 6           # Skip the opening
+PUZZLE_LOOKAHEAD = 5         # Plies of the game scanned for a material swing or mate
+PUZZLE_MIN_SWING = 200       # Centipawns gained compared to the previous position
+PUZZLE_MIN_ADVANTAGE = 200   # Centipawns the solver must be ahead after the best move
+PUZZLE_MIN_GAP = 150         # Centipawns between the best and second best move
+PUZZLE_DEPTH = 16
+PUZZLE_BATCH_SIZE = 64
+PIECE_VALUES = {chess.PAWN: 100, chess.KNIGHT: 300, chess.BISHOP: 300,
+                chess.ROOK: 500, chess.QUEEN: 900, chess.KING: 0}
+
+# Perft reference positions with their known node counts for depth 1, 2, ...
+PERFT_SUITE = [
+    ("Start position", chess.STARTING_FEN,
+     [20, 400, 8902, 197281, 4865609, 119060324]),
+    ("Kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     [48, 2039, 97862, 4085603, 193690690]),
+    ("En passant endgame", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     [14, 191, 2812, 43238, 674624, 11030083]),
+    ("Promotions", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     [6, 264, 9467, 422333, 15833292]),
+    ("Promotion checks", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     [44, 1486, 62379, 2103487, 89941194]),
+    ("Middlegame", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     [46, 2079, 89890, 3894594, 164075551]),
+]
+
+# Difficulty calibration tournaments
+TOURNAMENT_ELO_FILE = 'chess_elo_table.json'
+TOURNAMENT_REFERENCE_ELOS = [1400, 1800, 2200, 2600]  # UCI_Elo of the reference players
+TOURNAMENT_REFERENCE_TIME = 0.1  # Seconds per move for the reference players
+TOURNAMENT_MAX_GAMES = 400    # Per match; games are played in colour-swapped pairs
+TOURNAMENT_MIN_GAMES = 8      # Before any early stop
+TOURNAMENT_MAX_PLIES = 300    # Longer games are adjudicated drawn
+TOURNAMENT_SPRT_ELO = (0, 50)  # H0: not stronger; H1: at least 50 Elo stronger
+TOURNAMENT_SPRT_ERROR = 0.05   # Both alpha and beta
+TOURNAMENT_CI_ELO = 40        # Also stop once the 95% confidence interval is this narrow
+TOURNAMENT_BOOK_PLIES = 8     # Depth of the random walk through a polyglot book
+TOURNAMENT_OPENINGS = [  # Used without a book
+    "e2e4 e7e5 g1f3 b8c6 f1b5 a7a6",
+    "e2e4 e7e5 g1f3 b8c6 f1c4 f8c5",
+    "e2e4 c7c5 g1f3 d7d6 d2d4 c5d4",
+    "e2e4 c7c5 b1c3 b8c6 g2g3 g7g6",
+    "e2e4 e7e6 d2d4 d7d5 b1c3 g8f6",
+    "e2e4 c7c6 d2d4 d7d5 e4e5 c8f5",
+    "e2e4 d7d5 e4d5 d8d5 b1c3 d5a5",
+    "d2d4 d7d5 c2c4 e7e6 b1c3 g8f6",
+    "d2d4 d7d5 c2c4 c7c6 g1f3 g8f6",
+    "d2d4 g8f6 c2c4 g7g6 b1c3 f8g7",
+    "d2d4 g8f6 c2c4 e7e6 b1c3 f8b4",
+    "d2d4 f7f5 g2g3 g8f6 f1g2 g7g6",
+    "c2c4 e7e5 b1c3 g8f6 g1f3 b8c6",
+    "g1f3 d7d5 g2g3 g8f6 f1g2 c7c6",
+]
+
+class BoardLayout:
+    """Board and side panel geometry for the current window size"""
+    def __init__(self, width=WIDTH, height=HEIGHT):
+        self.resize(width, height)
+        
+    def resize(self, width, height):
+        """Recompute the geometry for a new window size"""
+        self.width = max(width, MIN_WIDTH)
+        self.height = max(height, MIN_HEIGHT)
+        self.square_size = min(self.height, self.width - PANEL_WIDTH) // 8
+        self.board_size = self.square_size * 8
+        self.piece_size = self.square_size - 2 * self.piece_padding
+        self.panel_x = self.board_size + 10
+        
+    @property
+    def piece_padding(self):
+        return max(2, self.square_size // 9)
+        
+    # The side panel stacks fixed sections from the top (history, clocks, captured
+    # pieces, status, opening explorer) and the hint and buttons from the bottom.
+    EXPLORER_Y = 520
+    EXPLORER_ROW_HEIGHT = 25
+    
+    @property
+    def controls_y(self):
+        """Top of the button row along the bottom of the side panel"""
+        return self.height - 60
+        
+    @property
+    def hint_y(self):
+        return self.controls_y - 35
+        
+    @property
+    def explorer_rows(self):
+        """Opening explorer moves that fit above the hint; 0 leaves the explorer out"""
+        space = self.hint_y - self.EXPLORER_Y - 30  # Below the explorer's header
+        return max(0, min(EXPLORER_MOVES_SHOWN, space // self.EXPLORER_ROW_HEIGHT))
+        
+    def square_rect(self, row, col):
+        """Screen rectangle of the square at (row, col)"""
+        return pygame.Rect(col * self.square_size, row * self.square_size,
+                           self.square_size, self.square_size)
+        
+    def square_at(self, pos):
+        """Convert a screen position to (row, col), or None if it is off the board"""
+        x, y = pos
+        if x >= self.board_size or y >= self.board_size:
+            return None
+        return (y // self.square_size, x // self.square_size)
+
+class SurfaceCache:
+    """Keep surfaces rendered for the most recently used sizes"""
+    def __init__(self, max_entries=SIZE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        
+    def get(self, key, render):
+        """Return the cached value for key, rendering it on a miss"""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        value = render()
+        self.entries[key] = value
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return value
+
+def find_stockfish_path():
+    """Path of the Stockfish binary for this operating system"""
+    return STOCKFISH_PATHS.get(os.name, STOCKFISH_PATHS['fallback'])
+
 class Button:
     def __init__(self, x, y, width, height, text, font_size=32):
         self.rect = pygame.Rect(x, y, width, height)
@@ -55,19 +276,35 @@ class StartupMenu:
         self.running = True
         self.selected_theme = "classic"
         self.difficulty = 1  # Default difficulty
-        center_x = WIDTH // 2
+        self.time_control = None  # No clock by default
+        self.width, self.height = screen.get_size()
+        self.layout_buttons()
         
+    def layout_buttons(self):
+        """Place the buttons for the current window size"""
+        center_x = self.width // 2
         self.buttons = {
-            'new_game': Button(center_x - 100, 150, 200, 50, "New Game"),
-            'load_game': Button(center_x - 100, 220, 200, 50, "Load Game"),
-            'classic_theme': Button(center_x - 250, 290, 200, 50, "Classic Theme"),
-            'modern_theme': Button(center_x + 50, 290, 200, 50, "Modern Theme"),
-            'difficulty_easy': Button(center_x - 250, 360, 150, 50, "Easy", 24),
-            'difficulty_medium': Button(center_x - 75, 360, 150, 50, "Medium", 24),
-            'difficulty_hard': Button(center_x + 100, 360, 150, 50, "Hard", 24),
-            'quit': Button(center_x - 100, 450, 200, 50, "Quit")
+            'new_game': Button(center_x - 100, 130, 200, 50, "New Game"),
+            'load_game': Button(center_x - 100, 190, 200, 50, "Load Game"),
+            'classic_theme': Button(center_x - 250, 250, 200, 50, "Classic Theme"),
+            'modern_theme': Button(center_x + 50, 250, 200, 50, "Modern Theme"),
+            'difficulty_easy': Button(center_x - 250, 310, 150, 50, "Easy", 24),
+            'difficulty_medium': Button(center_x - 75, 310, 150, 50, "Medium", 24),
+            'difficulty_hard': Button(center_x + 100, 310, 150, 50, "Hard", 24),
+            'clock_none': Button(center_x - 250, 370, 110, 50, "No clock", 24),
+            'clock_blitz': Button(center_x - 130, 370, 110, 50, "3+2", 24),
+            'clock_rapid': Button(center_x - 10, 370, 110, 50, "10+5", 24),
+            'clock_classical': Button(center_x + 110, 370, 140, 50, "30+20", 24),
+            'puzzles': Button(center_x - 250, 440, 200, 50, "Puzzles"),
+            'quit': Button(center_x + 50, 440, 200, 50, "Quit")
         }
         
+    def handle_resize(self, event):
+        """Lay the menu out again after the window has been resized"""
+        self.screen = pygame.display.get_surface()
+        self.width, self.height = self.screen.get_size()
+        self.layout_buttons()
+        
     def run(self):
         while self.running:
             self.screen.fill(MENU_BG_COLOR)
@@ -75,7 +312,7 @@ class StartupMenu:
             # Draw title
             font = pygame.font.SysFont('Arial', 48, bold=True)
             title = font.render("Chess Game", True, MENU_TEXT_COLOR)
-            title_rect = title.get_rect(center=(WIDTH // 2, 80))
+            title_rect = title.get_rect(center=(self.width // 2, 80))
             self.screen.blit(title, title_rect)
             
             # Draw buttons
@@ -86,24 +323,36 @@ class StartupMenu:
             font = pygame.font.SysFont('Arial', 24)
             theme_text = font.render(f"Selected Theme: {self.selected_theme.title()}", 
                                    True, MENU_TEXT_COLOR)
-            self.screen.blit(theme_text, (WIDTH // 2 - 100, 520))
+            self.screen.blit(theme_text, (self.width // 2 - 100, 510))
             
             # Draw selected difficulty text
             difficulty_name = ["Easy", "Medium", "Hard"][self.difficulty]
             diff_text = font.render(f"Difficulty: {difficulty_name}", 
                                    True, MENU_TEXT_COLOR)
-            self.screen.blit(diff_text, (WIDTH // 2 - 100, 550))
+            self.screen.blit(diff_text, (self.width // 2 - 100, 540))
+            
+            # Draw selected time control text
+            if self.time_control:
+                clock_name = f"{self.time_control[0] // 60}+{self.time_control[1]}"
+            else:
+                clock_name = "No clock"
+            clock_text = font.render(f"Time control: {clock_name}", True, MENU_TEXT_COLOR)
+            self.screen.blit(clock_text, (self.width // 2 - 100, 570))
             
             pygame.display.flip()
             
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
-                    return 'quit', self.selected_theme, self.difficulty
+                    return 'quit', self.selected_theme, self.difficulty, self.time_control
+                
+                if event.type == pygame.VIDEORESIZE:
+                    self.handle_resize(event)
+                    continue
                     
                 for button_name, button in self.buttons.items():
                     if button.handle_event(event):
                         if button_name == 'quit':
-                            return 'quit', self.selected_theme, self.difficulty
+                            return 'quit', self.selected_theme, self.difficulty, self.time_control
                         elif button_name == 'classic_theme':
                             self.selected_theme = 'classic'
                         elif button_name == 'modern_theme':
@@ -114,44 +363,121 @@ class StartupMenu:
                             self.difficulty = 1
                         elif button_name == 'difficulty_hard':
                             self.difficulty = 2
-                        elif button_name in ['new_game', 'load_game']:
-                            return button_name, self.selected_theme, self.difficulty
+                        elif button_name in TIME_CONTROLS:
+                            self.time_control = TIME_CONTROLS[button_name]
+                        elif button_name in ['new_game', 'load_game', 'puzzles']:
+                            return button_name, self.selected_theme, self.difficulty, self.time_control
+
+class ChessClock:
+    """Two-sided chess clock with a base time and a Fischer increment.
+    
+    Remaining time is derived from the timestamp of the last clock press, so
+    reading it is exact to the millisecond however often it is drawn.
+    """
+    def __init__(self, base_ms, increment_ms):
+        self.remaining = {chess.WHITE: base_ms, chess.BLACK: base_ms}
+        self.increment_ms = increment_ms
+        self.running = None  # Color whose time is running
+        self.started_at = 0
+        
+    def start(self, color, now):
+        self.running = color
+        self.started_at = now
+        
+    def stop(self, now):
+        """Freeze both clocks"""
+        if self.running is not None:
+            self.remaining[self.running] = self.remaining_ms(self.running, now)
+            self.running = None
+            
+    def press(self, now):
+        """The running side has moved: add its increment and start the opponent's clock"""
+        color = self.running
+        if color is None:
+            return
+        self.remaining[color] = self.remaining_ms(color, now) + self.increment_ms
+        self.start(not color, now)
+        
+    def remaining_ms(self, color, now):
+        remaining = self.remaining[color]
+        if color == self.running:
+            remaining -= now - self.started_at
+        return max(0, remaining)
+        
+    def flagged(self, now):
+        """Color whose flag has fallen, or None"""
+        if self.running is not None and self.remaining_ms(self.running, now) <= 0:
+            return self.running
+        return None
+        
+    def engine_limit(self, now, depth=None):
+        """Search limit that lets the engine budget its own time"""
+        return chess.engine.Limit(
+            depth=depth,
+            white_clock=self.remaining_ms(chess.WHITE, now) / 1000,
+            black_clock=self.remaining_ms(chess.BLACK, now) / 1000,
+            white_inc=self.increment_ms / 1000,
+            black_inc=self.increment_ms / 1000
+        )
+        
+    @staticmethod
+    def format_ms(ms):
+        minutes, seconds = divmod(ms / 1000, 60)
+        if ms < CLOCK_LOW_TIME_MS:
+            return f"{int(minutes)}:{seconds:04.1f}"
+        return f"{int(minutes)}:{int(seconds):02d}"
 
 class PromotionMenu:
-    def __init__(self, screen, square_pos, is_white):
+    def __init__(self, screen, square_pos, is_white, layout):
         self.screen = screen
         self.is_white = is_white
         self.color = 'white' if is_white else 'black'
-        col, row = square_pos
-        self.x = col * SQUARE_SIZE
-        self.y = row * SQUARE_SIZE
-        self.width = SQUARE_SIZE
-        self.height = SQUARE_SIZE * 4
-        if self.y + self.height > BOARD_SIZE:
-            self.y = BOARD_SIZE - self.height
+        self.square_pos = square_pos
+        self.layout = layout
         self.pieces = ['Q', 'R', 'B', 'N']
         self.selected = None
         
+    @property
+    def x(self):
+        return self.square_pos[0] * self.layout.square_size
+        
+    @property
+    def y(self):
+        # Keep the menu on the board when promoting on the bottom rank
+        y = self.square_pos[1] * self.layout.square_size
+        return min(y, self.layout.board_size - self.height)
+        
+    @property
+    def width(self):
+        return self.layout.square_size
+        
+    @property
+    def height(self):
+        return self.layout.square_size * 4
+        
     def draw(self, pieces_images):
+        square_size = self.layout.square_size
+        padding = self.layout.piece_padding
         pygame.draw.rect(self.screen, (240, 240, 240), 
                         (self.x, self.y, self.width, self.height))
         pygame.draw.rect(self.screen, (0, 0, 0), 
                         (self.x, self.y, self.width, self.height), 2)
         
         for i, piece in enumerate(self.pieces):
-            piece_y = self.y + (i * SQUARE_SIZE)
+            piece_y = self.y + (i * square_size)
             if self.is_hovered(pygame.mouse.get_pos(), i):
                 pygame.draw.rect(self.screen, (200, 200, 100),
-                               (self.x, piece_y, SQUARE_SIZE, SQUARE_SIZE))
+                               (self.x, piece_y, square_size, square_size))
             piece_surface = pieces_images[self.color][piece]
             self.screen.blit(piece_surface, 
-                           (self.x + 10, piece_y + 10))
+                           (self.x + padding, piece_y + padding))
                            
     def is_hovered(self, pos, index):
         mouse_x, mouse_y = pos
-        piece_y = self.y + (index * SQUARE_SIZE)
-        return (self.x <= mouse_x <= self.x + SQUARE_SIZE and
-                piece_y <= mouse_y <= piece_y + SQUARE_SIZE)
+        square_size = self.layout.square_size
+        piece_y = self.y + (index * square_size)
+        return (self.x <= mouse_x <= self.x + square_size and
+                piece_y <= mouse_y <= piece_y + square_size)
                 
     def handle_click(self, pos):
         for i, piece in enumerate(self.pieces):
@@ -159,31 +485,1203 @@ class PromotionMenu:
                 return piece
         return None
 
+class GameRecord:
+    """Compact record of a game's moves.
+    
+    Each move is packed into a 16-bit integer (from square, to square and
+    promotion piece). SAN, turn numbers and captured pieces are derived from
+    the moves on demand and cached as far as they have been requested, along
+    with per-ply capture counts and periodic board snapshots for navigation.
+    """
+    def __init__(self, start_fen=chess.STARTING_FEN, moves=(), legacy_history=None, legacy_captured=None,
+                 game_id=None):
+        self.start_fen = start_fen
+        self.moves = array('H', moves)
+        # Kept across saves and loads, so every save of a game is known to be the same game
+        self.game_id = game_id or uuid.uuid4().hex
+        # History of saves made before games kept a move record
+        self.legacy_history = legacy_history or []
+        self.legacy_captured = legacy_captured or {'white': [], 'black': []}
+        fields = start_fen.split()
+        self._start_white = fields[1] == 'w'
+        self._start_fullmove = int(fields[5]) if len(fields) > 5 else 1
+        self._cursor = None  # Board after the last derived move
+        self._san = []
+        self._captured = None
+        self._capture_counts = []  # Captured (white, black) piece counts after each move
+        self._snapshots = []  # Board after every SNAPSHOT_INTERVAL plies
+        
+    @staticmethod
+    def pack_move(move):
+        return move.from_square | (move.to_square << 6) | ((move.promotion or 0) << 12)
+        
+    @staticmethod
+    def unpack_move(value):
+        return chess.Move(value & 63, (value >> 6) & 63, (value >> 12) or None)
+        
+    def __len__(self):
+        return len(self.moves)
+        
+    def append(self, move):
+        """Add a move played from the current end of the record"""
+        self.moves.append(self.pack_move(move))
+        
+    def move_at(self, ply):
+        return self.unpack_move(self.moves[ply])
+        
+    def truncate(self, ply):
+        """Drop the moves after ply, keeping the derived data that is still valid"""
+        del self.moves[ply:]
+        if self._cursor is None or len(self._san) <= ply:
+            # Nothing past ply has been derived yet
+            return
+        while len(self._san) > ply:
+            self._cursor.pop()
+            self._san.pop()
+            self._capture_counts.pop()
+        white, black = self._counts_at(ply)
+        del self._captured['white'][white:]
+        del self._captured['black'][black:]
+        del self._snapshots[ply // SNAPSHOT_INTERVAL + 1:]
+        
+    def board(self):
+        """Replay the record into a board that keeps the full move stack"""
+        board = chess.Board(self.start_fen)
+        for value in self.moves:
+            board.push(self.unpack_move(value))
+        return board
+        
+    def _derive(self, count):
+        """Extend the SAN and capture caches to cover the first count moves"""
+        if self._cursor is None:
+            self._cursor = chess.Board(self.start_fen)
+            self._captured = {color: list(pieces) for color, pieces in self.legacy_captured.items()}
+            self._snapshots = [self._cursor.copy(stack=False)]
+        board = self._cursor
+        while len(self._san) < count:
+            move = self.move_at(len(self._san))
+            if board.is_en_passant(move):
+                capture = chess.Piece(chess.PAWN, not board.turn)
+            else:
+                capture = board.piece_at(move.to_square)
+            if capture:
+                captured_color = 'white' if capture.color == chess.WHITE else 'black'
+                self._captured[captured_color].append(capture.symbol())
+            self._san.append(board.san(move))
+            board.push(move)
+            self._capture_counts.append((len(self._captured['white']), len(self._captured['black'])))
+            if len(self._san) % SNAPSHOT_INTERVAL == 0:
+                self._snapshots.append(board.copy(stack=False))
+                
+    def _counts_at(self, ply):
+        if ply:
+            return self._capture_counts[ply - 1]
+        return len(self.legacy_captured['white']), len(self.legacy_captured['black'])
+        
+    def board_at(self, ply):
+        """Position after ply moves, from the nearest snapshot (no move stack)"""
+        self._derive(ply)
+        board = self._snapshots[ply // SNAPSHOT_INTERVAL].copy(stack=False)
+        for i in range(ply - ply % SNAPSHOT_INTERVAL, ply):
+            board.push(self.move_at(i))
+        return board
+            
+    def entry(self, ply):
+        """History entry ('turn', 'move', 'player') of the move at ply"""
+        self._derive(ply + 1)
+        offset = ply + (0 if self._start_white else 1)
+        return {
+            'turn': self._start_fullmove + offset // 2,
+            'move': self._san[ply],
+            'player': 'White' if offset % 2 == 0 else 'Black'
+        }
+        
+    def history(self, count):
+        """History entries of the last count moves, including any legacy history"""
+        first = max(0, len(self.moves) - count)
+        entries = [self.entry(ply) for ply in range(first, len(self.moves))]
+        missing = count - len(entries)
+        if missing > 0 and self.legacy_history:
+            entries = self.legacy_history[-missing:] + entries
+        return entries
+        
+    def captured(self, ply=None):
+        """Captured piece symbols after ply moves (default: all), keyed by the color of the captured pieces"""
+        if ply is None:
+            self._derive(len(self.moves))
+            return self._captured
+        self._derive(ply)
+        white, black = self._counts_at(ply)
+        return {'white': self._captured['white'][:white], 'black': self._captured['black'][:black]}
+        
+    def to_dict(self):
+        moves = array('H', self.moves)
+        if sys.byteorder == 'big':
+            moves.byteswap()  # Stored little-endian
+        data = {
+            'game_id': self.game_id,
+            'start_fen': self.start_fen,
+            'moves': base64.b64encode(moves.tobytes()).decode('ascii')
+        }
+        if self.legacy_history:
+            data['legacy_history'] = self.legacy_history
+            data['legacy_captured'] = self.legacy_captured
+        return data
+        
+    @classmethod
+    def from_dict(cls, data):
+        moves = array('H')
+        moves.frombytes(base64.b64decode(data['moves']))
+        if sys.byteorder == 'big':
+            moves.byteswap()
+        return cls(data['start_fen'], moves, data.get('legacy_history'), data.get('legacy_captured'),
+                   data.get('game_id'))
+
+class GameArchive:
+    """Append-only archive of compressed saves with an index for random access.
+    
+    An entry is committed once its index record is on disk: the data is synced
+    before the index record is appended, so a crash can leave unreferenced data
+    or a torn index record, and both are ignored when reading.
+    """
+    def __init__(self, path=ARCHIVE_FILE, index_path=ARCHIVE_INDEX_FILE):
+        self.path = path
+        self.index_path = index_path
+        self.file = None
+        self.map = None
+        
+    def entries(self):
+        """(offset, length, timestamp) of every committed entry"""
+        if not os.path.exists(self.index_path):
+            return []
+        with open(self.index_path, 'rb') as f:
+            data = f.read()
+        complete = len(data) - len(data) % ARCHIVE_INDEX_ENTRY.size
+        return list(ARCHIVE_INDEX_ENTRY.iter_unpack(data[:complete]))
+        
+    def __len__(self):
+        if not os.path.exists(self.index_path):
+            return 0
+        return os.path.getsize(self.index_path) // ARCHIVE_INDEX_ENTRY.size
+        
+    def entry(self, number):
+        """(offset, length, timestamp) of one committed entry, read straight from its index record"""
+        if not 0 <= number < len(self):
+            raise IndexError(f"No archive entry {number}")
+        with open(self.index_path, 'rb') as f:
+            f.seek(number * ARCHIVE_INDEX_ENTRY.size)
+            return ARCHIVE_INDEX_ENTRY.unpack(f.read(ARCHIVE_INDEX_ENTRY.size))
+        
+    def append(self, save_data):
+        """Compress and commit a save, returning its entry number"""
+        data = zlib.compress(json.dumps(save_data).encode('utf-8'))
+        with open(self.path, 'ab') as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        
+        with open(self.index_path, 'ab') as f:
+            # Drop a record torn by an earlier crash so this one stays aligned
+            size = f.seek(0, os.SEEK_END)
+            if size % ARCHIVE_INDEX_ENTRY.size:
+                f.truncate(size - size % ARCHIVE_INDEX_ENTRY.size)
+            f.write(ARCHIVE_INDEX_ENTRY.pack(offset, len(data), time.time()))
+            f.flush()
+            os.fsync(f.fileno())
+            return f.tell() // ARCHIVE_INDEX_ENTRY.size - 1
+        
+    def read(self, number):
+        """Decode a single entry without parsing the others"""
+        offset, length, _ = self.entry(number)
+        if self.map is None or offset + length > len(self.map):
+            # Map again when the archive grew since it was mapped
+            self.close()
+            self.file = open(self.path, 'rb')
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        return json.loads(zlib.decompress(self.map[offset:offset + length]))
+        
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class PositionIndex:
+    """On-disk index from position hashes to the moves played there and their results.
+    
+    Sources are indexed incrementally: saved games once, PGN journals from the
+    byte offset reached by the previous run. A saved game counts once however
+    often it was saved: its latest finished save replaces the earlier ones.
+    """
+    def __init__(self, path=EXPLORER_DB):
+        self.connection = sqlite3.connect(path)
+        # Let the explorer read while the archive writer thread updates the index
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS moves (
+                key INTEGER NOT NULL,
+                move TEXT NOT NULL,
+                games INTEGER NOT NULL,
+                white INTEGER NOT NULL,
+                draws INTEGER NOT NULL,
+                black INTEGER NOT NULL,
+                PRIMARY KEY (key, move)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS sources (
+                name TEXT PRIMARY KEY,
+                offset INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS games (
+                id TEXT PRIMARY KEY,
+                start_fen TEXT NOT NULL,
+                moves TEXT NOT NULL,
+                result TEXT NOT NULL
+            );
+        """)
+        
+    @staticmethod
+    def position_key(board):
+        # SQLite integers are signed 64-bit
+        key = chess.polyglot.zobrist_hash(board)
+        return key - (1 << 64) if key >= (1 << 63) else key
+        
+    def add_game(self, board, moves, result, count=1):
+        """Count every move of a game played from board (which is modified); -1 uncounts it"""
+        white, draw, black = {'1-0': (1, 0, 0), '1/2-1/2': (0, 1, 0), '0-1': (0, 0, 1)}.get(result, (0, 0, 0))
+        rows = []
+        for move in moves:
+            rows.append((self.position_key(board), move.uci(), count, white * count, draw * count, black * count))
+            board.push(move)
+        self.connection.executemany("""
+            INSERT INTO moves VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (key, move) DO UPDATE SET
+                games = games + excluded.games,
+                white = white + excluded.white,
+                draws = draws + excluded.draws,
+                black = black + excluded.black
+        """, rows)
+        if count < 0:
+            self.connection.executemany("DELETE FROM moves WHERE key = ? AND move = ? AND games <= 0",
+                                        [row[:2] for row in rows])
+        
+    def source_offset(self, name):
+        row = self.connection.execute("SELECT offset FROM sources WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+        
+    def index_file(self, filename):
+        """Index the games of a save file or PGN journal not indexed yet"""
+        name = os.path.abspath(filename)
+        offset = self.source_offset(name)
+        size = os.path.getsize(filename)
+        if offset >= size:
+            return
+        
+        with self.connection:
+            if filename.endswith('.pgn'):
+                with open(filename, 'r', errors='replace') as f:
+                    f.seek(offset)
+                    while True:
+                        game = chess.pgn.read_game(f)
+                        if game is None:
+                            break
+                        self.add_game(game.board(), game.mainline_moves(), game.headers.get('Result', '*'))
+                    offset = f.tell()
+            else:
+                with open(filename, 'r') as f:
+                    self.add_save(json.load(f))
+                offset = size
+            self.connection.execute("INSERT OR REPLACE INTO sources VALUES (?, ?)", (name, offset))
+            
+    def add_save(self, save_data):
+        """Count a saved game in place of its earlier saves (older saves only have the final position)"""
+        if 'record' not in save_data:
+            return
+        game_record = GameRecord.from_dict(save_data['record'])
+        moves = [game_record.move_at(ply) for ply in range(len(game_record))]
+        result = save_data.get('result') or game_record.board().result(claim_draw=True)
+        
+        previous = self.connection.execute("SELECT start_fen, moves, result FROM games WHERE id = ?",
+                                           (game_record.game_id,)).fetchone()
+        if previous:
+            start_fen, ucis, previous_result = previous
+            self.add_game(chess.Board(start_fen), [chess.Move.from_uci(uci) for uci in ucis.split()],
+                          previous_result, count=-1)
+            self.connection.execute("DELETE FROM games WHERE id = ?", (game_record.game_id,))
+        # An unfinished game has no result to tell yet
+        if result == '*':
+            return
+        self.add_game(chess.Board(game_record.start_fen), moves, result)
+        self.connection.execute("INSERT INTO games VALUES (?, ?, ?, ?)",
+                                (game_record.game_id, game_record.start_fen,
+                                 ' '.join(move.uci() for move in moves), result))
+            
+    def index_archive(self, archive):
+        """Index the archive entries not indexed yet (its offset counts entries)"""
+        name = os.path.abspath(archive.path)
+        with self.connection:
+            # Take the write lock before reading the offset, so the archive writer
+            # and a starting game never count the same entry twice
+            self.connection.execute("BEGIN IMMEDIATE")
+            indexed = self.source_offset(name)
+            count = len(archive)
+            for number in range(indexed, count):
+                self.add_save(archive.read(number))
+            if count > indexed:
+                self.connection.execute("INSERT OR REPLACE INTO sources VALUES (?, ?)", (name, count))
+            
+    def index_directory(self, directory='.'):
+        """Index all saved games and PGN journals in a directory"""
+        archive = GameArchive(os.path.join(directory, ARCHIVE_FILE), os.path.join(directory, ARCHIVE_INDEX_FILE))
+        try:
+            self.index_archive(archive)
+        except Exception as e:
+            print(f"Error indexing {ARCHIVE_FILE}: {e}")
+        finally:
+            archive.close()
+        for filename in sorted(os.listdir(directory)):
+            if (filename.startswith('chess_save_') and filename.endswith('.json')) or filename.endswith('.pgn'):
+                try:
+                    self.index_file(os.path.join(directory, filename))
+                except Exception as e:
+                    print(f"Error indexing {filename}: {e}")
+                    
+    def lookup(self, board, limit=EXPLORER_MOVES_SHOWN):
+        """Most played moves from a position as (move, games, white, draws, black)"""
+        rows = self.connection.execute(
+            "SELECT move, games, white, draws, black FROM moves WHERE key = ? AND games > 0 "
+            "ORDER BY games DESC LIMIT ?",
+            (self.position_key(board), limit)
+        ).fetchall()
+        results = []
+        for uci, games, white, draws, black in rows:
+            move = chess.Move.from_uci(uci)
+            # Guard against hash collisions
+            if board.is_legal(move):
+                results.append((move, games, white, draws, black))
+        return results
+        
+    def close(self):
+        self.connection.close()
+
+class Puzzle:
+    """A tactical puzzle: a position and the solution line starting with the solver's move"""
+    def __init__(self, fen, moves):
+        self.fen = fen
+        self.moves = [chess.Move.from_uci(uci) for uci in moves]
+        
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['fen'], data['moves'])
+        
+    def oriented(self):
+        """Board and solution with the solver playing White, mirroring Black puzzles"""
+        board = chess.Board(self.fen)
+        if board.turn == chess.WHITE:
+            return board, list(self.moves)
+        solution = [chess.Move(chess.square_mirror(move.from_square), chess.square_mirror(move.to_square),
+                               move.promotion) for move in self.moves]
+        return board.mirror(), solution
+
+class PuzzleIndex:
+    """Lazy random access to the puzzle set through its offset index"""
+    def __init__(self, path=PUZZLE_FILE, index_path=PUZZLE_INDEX_FILE):
+        self.path = path
+        self.offsets = array('Q')
+        if os.path.exists(index_path):
+            with open(index_path, 'rb') as f:
+                data = f.read()
+            # Ignore a partially written last entry
+            self.offsets.frombytes(data[:len(data) - len(data) % self.offsets.itemsize])
+            if sys.byteorder == 'big':
+                self.offsets.byteswap()
+                
+    def __len__(self):
+        return len(self.offsets)
+        
+    def get(self, number):
+        """Read a single puzzle without parsing the others"""
+        with open(self.path, 'rb') as f:
+            f.seek(self.offsets[number])
+            return Puzzle.from_dict(json.loads(f.readline()))
+
+def material_balance(board, color):
+    """Material of color minus the opponent's, in centipawns"""
+    balance = 0
+    for piece_type, value in PIECE_VALUES.items():
+        balance += value * (len(board.pieces(piece_type, color)) - len(board.pieces(piece_type, not color)))
+    return balance
+
+def iter_archive_games(paths):
+    """Stream (source, start board, moves) for every game in save files and PGNs"""
+    for path in paths:
+        try:
+            if path == ARCHIVE_FILE:
+                archive = GameArchive(path)
+                try:
+                    for number in range(len(archive)):
+                        _, game_record = load_save_data(archive.read(number))
+                        moves = [game_record.move_at(ply) for ply in range(len(game_record))]
+                        if moves:
+                            yield f"{ARCHIVE_PREFIX}{number}", chess.Board(game_record.start_fen), moves
+                finally:
+                    archive.close()
+            elif path.endswith('.pgn'):
+                with open(path, 'r', errors='replace') as f:
+                    while True:
+                        game = chess.pgn.read_game(f)
+                        if game is None:
+                            break
+                        yield path, game.board(), list(game.mainline_moves())
+            else:
+                _, game_record = load_game(path)
+                moves = [game_record.move_at(ply) for ply in range(len(game_record))]
+                if moves:
+                    yield path, chess.Board(game_record.start_fen), moves
+        except Exception as e:
+            print(f"Error reading {path}: {e}")
+
+def find_puzzle_candidates(source, board, moves):
+    """Cheap pre-filter: positions after which the side to move wins material or mates.
+    
+    Only the moves actually played are looked at, so no engine is needed.
+    """
+    for ply, move in enumerate(moves[:-1]):
+        parent_fen = board.fen()
+        board.push(move)
+        if ply + 1 < PUZZLE_MIN_PLY or board.is_game_over():
+            continue
+        
+        side = board.turn
+        before = material_balance(board, side)
+        lookahead = board.copy(stack=False)
+        swing = 0
+        for future in moves[ply + 1:ply + 1 + PUZZLE_LOOKAHEAD]:
+            lookahead.push(future)
+            if lookahead.is_checkmate():
+                swing = PUZZLE_MIN_SWING if lookahead.turn != side else 0
+                break
+            # Count material once the opponent has replied, not mid-exchange
+            if lookahead.turn == side:
+                swing = max(swing, material_balance(lookahead, side) - before)
+        
+        if swing >= PUZZLE_MIN_SWING:
+            yield {'source': source, 'ply': ply + 1, 'fen': board.fen(), 'parent_fen': parent_fen}
+
+_puzzle_engine = None
+
+def init_puzzle_worker(engine_path):
+    """Start one engine per verification worker process"""
+    global _puzzle_engine
+    _puzzle_engine = chess.engine.SimpleEngine.popen_uci(engine_path)
+    # Worker processes skip atexit handlers, but run multiprocessing finalizers
+    multiprocessing.util.Finalize(None, _puzzle_engine.quit, exitpriority=10)
+
+def best_move_gap(infos, turn):
+    """Centipawns between the best and second best move of a MultiPV 2 analysis"""
+    best = infos[0]['score'].pov(turn).score(mate_score=100000)
+    second = infos[1]['score'].pov(turn).score(mate_score=100000)
+    return best - second
+
+def verify_puzzle_candidate(candidate, depth=PUZZLE_DEPTH):
+    """Expensive stage: confirm the swing and a unique best move with the engine"""
+    board = chess.Board(candidate['fen'])
+    limit = chess.engine.Limit(depth=depth)
+    infos = _puzzle_engine.analyse(board, limit, multipv=2)
+    if len(infos) < 2 or 'pv' not in infos[0]:
+        return None  # Only one legal move is not a puzzle
+    
+    best = infos[0]['score'].pov(board.turn).score(mate_score=100000)
+    if best < PUZZLE_MIN_ADVANTAGE or best_move_gap(infos, board.turn) < PUZZLE_MIN_GAP:
+        return None
+    
+    parent = chess.Board(candidate['parent_fen'])
+    parent_info = _puzzle_engine.analyse(parent, limit)
+    before = parent_info['score'].pov(board.turn).score(mate_score=100000)
+    if best - before < PUZZLE_MIN_SWING:
+        return None
+    
+    # Follow the line while every solver move is the only good one, so the
+    # solution never rejects an equally good alternative. It ends with a
+    # move of the solver.
+    solver = board.turn
+    solution = []
+    while True:
+        pv = infos[0]['pv']
+        solution.append(pv[0])
+        if len(solution) + 2 > PUZZLE_LOOKAHEAD or len(pv) < 2:
+            break
+        board.push(pv[0])
+        board.push(pv[1])
+        if board.is_game_over():
+            break
+        infos = _puzzle_engine.analyse(board, limit, multipv=2)
+        if 'pv' not in infos[0]:
+            break
+        if len(infos) >= 2 and best_move_gap(infos, solver) < PUZZLE_MIN_GAP:
+            break  # A forced move (single legal move) is still unique
+        solution.append(pv[1])
+    return {
+        'fen': candidate['fen'],
+        'moves': [move.uci() for move in solution],
+        'eval': best,
+        'source': candidate['source'],
+        'ply': candidate['ply']
+    }
+
+def mine_puzzles(paths, workers=None, depth=PUZZLE_DEPTH):
+    """Mine puzzles from games and append them to the puzzle set and its index"""
+    if not paths:
+        paths = sorted(f for f in os.listdir('.')
+                       if (f.startswith('chess_save_') and f.endswith('.json')) or f.endswith('.pgn')
+                       or f == ARCHIVE_FILE)
+    
+    # Positions already in the puzzle set or seen in this run
+    seen = set()
+    if os.path.exists(PUZZLE_FILE):
+        with open(PUZZLE_FILE, 'r') as f:
+            for line in f:
+                seen.add(chess.Board(json.loads(line)['fen']).epd())
+                
+    def candidates():
+        for source, board, moves in iter_archive_games(paths):
+            for candidate in find_puzzle_candidates(source, board, moves):
+                key = chess.Board(candidate['fen']).epd()
+                if key not in seen:
+                    seen.add(key)
+                    yield candidate
+    
+    checked = found = 0
+    stream = candidates()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_puzzle_worker,
+                             initargs=(find_stockfish_path(),)) as pool, \
+            open(PUZZLE_FILE, 'ab') as puzzle_file, open(PUZZLE_INDEX_FILE, 'ab') as index_file:
+        while True:
+            batch = list(itertools.islice(stream, PUZZLE_BATCH_SIZE))
+            if not batch:
+                break
+            offsets = []
+            for puzzle in pool.map(verify_puzzle_candidate, batch, itertools.repeat(depth)):
+                checked += 1
+                if puzzle:
+                    offsets.append(puzzle_file.tell())
+                    puzzle_file.write((json.dumps(puzzle) + '\n').encode())
+            # Write the puzzles before the index entries that point at them
+            puzzle_file.flush()
+            index_file.write(b''.join(struct.pack('<Q', offset) for offset in offsets))
+            index_file.flush()
+            found += len(offsets)
+            print(f"Verified {checked} candidates, {found} puzzles found")
+    
+    print(f"Mining finished: {found} new puzzles written to {PUZZLE_FILE}")
+    return found
+
+def perft(board, depth):
+    """Count the leaf nodes of the legal move tree to the given depth"""
+    if depth == 0:
+        return 1
+    if depth == 1:
+        # Bulk counting: no need to play the last ply
+        return board.legal_moves.count()
+    nodes = 0
+    for move in board.legal_moves:
+        board.push(move)
+        nodes += perft(board, depth - 1)
+        board.pop()
+    return nodes
+
+def perft_subtree(fen, uci, depth):
+    """Perft below one root move, for running subtrees in worker processes"""
+    board = chess.Board(fen)
+    board.push(chess.Move.from_uci(uci))
+    return perft(board, depth - 1)
+
+def parallel_perft(pool, fen, depth):
+    """Perft with the root moves split across the process pool"""
+    board = chess.Board(fen)
+    if depth <= 1:
+        return perft(board, depth)
+    moves = [move.uci() for move in board.legal_moves]
+    return sum(pool.map(perft_subtree, itertools.repeat(fen), moves, itertools.repeat(depth)))
+
+def run_perft_suite(depth, workers=None):
+    """Check the move generator against the reference suite and report its throughput.
+    
+    Returns a process exit code: non-zero if any node count is wrong.
+    """
+    failures = 0
+    total_nodes = 0
+    total_time = 0.0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for name, fen, expected_counts in PERFT_SUITE:
+            for d in range(1, min(depth, len(expected_counts)) + 1):
+                start = time.perf_counter()
+                nodes = parallel_perft(pool, fen, d)
+                elapsed = time.perf_counter() - start
+                total_nodes += nodes
+                total_time += elapsed
+                
+                expected = expected_counts[d - 1]
+                status = "ok" if nodes == expected else f"FAIL (expected {expected})"
+                if nodes != expected:
+                    failures += 1
+                print(f"{name:<20} depth {d}: {nodes:>11} nodes {elapsed:8.3f}s "
+                      f"{nodes / max(elapsed, 1e-9):>12,.0f} nodes/s  {status}")
+    
+    print(f"Total: {total_nodes} nodes in {total_time:.3f}s "
+          f"({total_nodes / max(total_time, 1e-9):,.0f} nodes/s), {failures} failures")
+    return 1 if failures else 0
+
+def tournament_players():
+    """The difficulty presets and the strength-limited reference players"""
+    players = []
+    for name, settings in zip(['Easy', 'Medium', 'Hard'], DIFFICULTY_SETTINGS):
+        players.append({
+            'name': name,
+            'options': {"UCI_LimitStrength": False, "Skill Level": settings["Skill Level"]},
+            'depth': settings["Depth"],
+            'time': settings["Time"]
+        })
+    for elo in TOURNAMENT_REFERENCE_ELOS:
+        players.append({
+            'name': f"Elo {elo}",
+            'elo': elo,
+            'options': {"UCI_LimitStrength": True, "UCI_Elo": elo, "Skill Level": 20},
+            'depth': None,
+            'time': TOURNAMENT_REFERENCE_TIME
+        })
+    return players
+
+def tournament_openings(book=None, count=64):
+    """Opening lines as lists of UCI moves, walked from a polyglot book when one is given"""
+    if not book:
+        return [line.split() for line in TOURNAMENT_OPENINGS]
+    openings = []
+    with chess.polyglot.open_reader(book) as reader:
+        for _ in range(count):
+            board = chess.Board()
+            for _ in range(TOURNAMENT_BOOK_PLIES):
+                try:
+                    # Uniform over the book moves, so the main lines are not overplayed
+                    entry = reader.choice(board)
+                except IndexError:
+                    break
+                board.push(entry.move)
+            openings.append([move.uci() for move in board.move_stack])
+    return openings
+
+_tournament_engines = None
+
+def init_tournament_worker(engine_path):
+    """Start an engine for each side of the games played in this worker process"""
+    global _tournament_engines
+    _tournament_engines = [chess.engine.SimpleEngine.popen_uci(engine_path) for _ in range(2)]
+    for engine in _tournament_engines:
+        multiprocessing.util.Finalize(None, engine.quit, exitpriority=10)
+
+def play_tournament_game(white, black, opening):
+    """Play one engine game from an opening line and return its result string"""
+    board = chess.Board()
+    for uci in opening:
+        board.push_uci(uci)
+    
+    players = {chess.WHITE: white, chess.BLACK: black}
+    engines = {chess.WHITE: _tournament_engines[0], chess.BLACK: _tournament_engines[1]}
+    for color in (chess.WHITE, chess.BLACK):
+        engines[color].configure(players[color]['options'])
+    game = object()  # A new game object makes python-chess send ucinewgame
+    
+    while not board.is_game_over(claim_draw=True):
+        if board.ply() >= TOURNAMENT_MAX_PLIES:
+            return '1/2-1/2'
+        player = players[board.turn]
+        limit = chess.engine.Limit(depth=player['depth'], time=player['time'])
+        result = engines[board.turn].play(board, limit, game=game)
+        if result.resigned or result.move is None:
+            return '0-1' if board.turn == chess.WHITE else '1-0'
+        board.push(result.move)
+    return board.result(claim_draw=True)
+
+def play_tournament_pair(player, opponent, opening):
+    """Play both colours of an opening; returns the player's two scores"""
+    scores = []
+    for white, black in ((player, opponent), (opponent, player)):
+        result = play_tournament_game(white, black, opening)
+        score = {'1-0': 1.0, '0-1': 0.0}.get(result, 0.5)
+        scores.append(score if white is player else 1.0 - score)
+    return scores
+
+class TournamentMatch:
+    """Running score of one player against an opponent, with its stopping rules"""
+    def __init__(self, player, opponent):
+        self.player = player
+        self.opponent = opponent
+        self.scores = []
+        self.scheduled = 0
+        
+    @property
+    def games(self):
+        return len(self.scores)
+        
+    def mean_and_variance(self):
+        """Mean score per game and the variance of a single game's score.
+        
+        A win and a loss are added as a prior, so a clean sweep does not
+        read as an infinite Elo difference known exactly.
+        """
+        scores = self.scores + [1.0, 0.0]
+        mean = sum(scores) / len(scores)
+        variance = sum((score - mean) ** 2 for score in scores) / len(scores)
+        return mean, variance
+        
+    @staticmethod
+    def elo_from_score(score):
+        score = min(max(score, 1e-3), 1 - 1e-3)
+        return 400 * math.log10(score / (1 - score))
+        
+    @staticmethod
+    def score_from_elo(elo):
+        return 1 / (1 + 10 ** (-elo / 400))
+        
+    def elo(self):
+        """Elo difference to the opponent and the half-width of its 95% confidence interval"""
+        mean, variance = self.mean_and_variance()
+        margin = 1.96 * math.sqrt(variance / self.games)
+        low = self.elo_from_score(mean - margin)
+        high = self.elo_from_score(mean + margin)
+        return self.elo_from_score(mean), (high - low) / 2
+        
+    def llr(self):
+        """Log-likelihood ratio of the SPRT, by the normal approximation of the score"""
+        mean, variance = self.mean_and_variance()
+        s0, s1 = (self.score_from_elo(elo) for elo in TOURNAMENT_SPRT_ELO)
+        return self.games * (s1 - s0) * (2 * mean - s0 - s1) / (2 * variance)
+        
+    def decision(self):
+        """'H1' (stronger), 'H0' (not stronger) or None while the SPRT is undecided"""
+        if self.games < TOURNAMENT_MIN_GAMES:
+            return None
+        lower = math.log(TOURNAMENT_SPRT_ERROR / (1 - TOURNAMENT_SPRT_ERROR))
+        upper = math.log((1 - TOURNAMENT_SPRT_ERROR) / TOURNAMENT_SPRT_ERROR)
+        llr = self.llr()
+        if llr >= upper:
+            return 'H1'
+        if llr <= lower:
+            return 'H0'
+        return None
+        
+    def finished(self, max_games):
+        if self.games >= max_games:
+            return True
+        if self.games < TOURNAMENT_MIN_GAMES:
+            return False
+        return self.decision() is not None or self.elo()[1] <= TOURNAMENT_CI_ELO
+        
+    def to_dict(self):
+        elo, margin = self.elo()
+        return {
+            'player': self.player['name'],
+            'opponent': self.opponent['name'],
+            'games': self.games,
+            'score': sum(self.scores),
+            'elo': round(elo, 1),
+            'margin': round(margin, 1),
+            'llr': round(self.llr(), 3),
+            'sprt': self.decision()
+        }
+
+def rate_presets(matches):
+    """Absolute preset ratings: the results against the reference players, weighted by precision"""
+    ratings = {}
+    for name in ['Easy', 'Medium', 'Hard']:
+        weight_sum = weighted_elo = 0.0
+        for match in matches:
+            if match.player['name'] != name or 'elo' not in match.opponent or not match.games:
+                continue
+            elo, margin = match.elo()
+            weight = 1 / max(margin, 1.0) ** 2
+            weight_sum += weight
+            weighted_elo += weight * (match.opponent['elo'] + elo)
+        if weight_sum:
+            ratings[name] = {'elo': round(weighted_elo / weight_sum), 'margin': round(1 / math.sqrt(weight_sum))}
+        else:
+            ratings[name] = None
+    return ratings
+
+def run_tournament(book=None, workers=None, max_games=TOURNAMENT_MAX_GAMES):
+    """Calibrate the difficulty presets against each other and the reference players.
+    
+    Matches run side by side on a process pool, a colour-swapped pair of games
+    at a time, until their SPRT is decided, their Elo is known precisely enough
+    or max_games is reached. The Elo table is written to TOURNAMENT_ELO_FILE.
+    """
+    players = tournament_players()
+    presets = players[:len(DIFFICULTY_SETTINGS)]
+    matches = [TournamentMatch(player, opponent)
+               for player, opponent in itertools.combinations(presets, 2)]
+    matches += [TournamentMatch(preset, reference)
+                for preset in presets for reference in players[len(DIFFICULTY_SETTINGS):]]
+    openings = tournament_openings(book)
+    slots = 2 * (workers or os.cpu_count() or 1)
+    
+    engine_path = find_stockfish_path()
+    pending = {}
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_tournament_worker,
+                             initargs=(engine_path,)) as pool:
+        while True:
+            # Keep the pool busy with the matches that have played the fewest games
+            while len(pending) < slots:
+                open_matches = [match for match in matches
+                                if match.scheduled < max_games and not match.finished(max_games)]
+                if not open_matches:
+                    break
+                match = min(open_matches, key=lambda match: match.scheduled)
+                opening = openings[(match.scheduled // 2) % len(openings)]
+                future = pool.submit(play_tournament_pair, match.player, match.opponent, opening)
+                pending[future] = match
+                match.scheduled += 2
+            if not pending:
+                break
+            
+            done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                match = pending.pop(future)
+                match.scores.extend(future.result())
+                if match.finished(max_games):
+                    elo, margin = match.elo()
+                    print(f"{match.player['name']} vs {match.opponent['name']}: {sum(match.scores):g}/{match.games}, "
+                          f"Elo {elo:+.0f} +/- {margin:.0f}, SPRT {match.decision() or 'undecided'}")
+    
+    table = {
+        'engine': engine_path,
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'presets': rate_presets(matches),
+        'settings': {preset['name']: settings for preset, settings in zip(presets, DIFFICULTY_SETTINGS)},
+        'matches': [match.to_dict() for match in matches if match.games]
+    }
+    with open(TOURNAMENT_ELO_FILE, 'w') as f:
+        json.dump(table, f, indent=2)
+    
+    for name, rating in table['presets'].items():
+        print(f"{name:<8} " + (f"Elo {rating['elo']} +/- {rating['margin']}" if rating else "unrated"))
+    print(f"Elo table written to {TOURNAMENT_ELO_FILE}")
+    return table
+
+class HintEngine:
+    """Speculative background search for the player's best move.
+    
+    Runs on the game's engine while it is the player's turn (the engine is
+    idle then) and keeps the best move found so far for each position.
+    """
+    def __init__(self, engine):
+        self.engine = engine
+        self.cache = {}  # Zobrist hash -> (best move, depth)
+        self.thread = None
+        self.analysis = None
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        
+    def start(self, board):
+        """Start searching the position unless it is already searched deep enough"""
+        self.stop()
+        key = chess.polyglot.zobrist_hash(board)
+        if self.cache.get(key, (None, 0))[1] >= HINT_DEPTH:
+            return
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.search, args=(board.copy(), key), daemon=True)
+        self.thread.start()
+        
+    def search(self, board, key):
+        """Run the analysis, caching each new principal variation"""
+        try:
+            with self.lock:
+                if self.stopped.is_set():
+                    return
+                self.analysis = self.engine.analysis(board, chess.engine.Limit(depth=HINT_DEPTH))
+            for info in self.analysis:
+                pv = info.get('pv')
+                depth = info.get('depth', 0)
+                if pv and depth >= self.cache.get(key, (None, 0))[1]:
+                    self.cache[key] = (pv[0], depth)
+        except Exception as e:
+            print(f"Hint engine error: {e}")
+        finally:
+            with self.lock:
+                self.analysis = None
+                
+    def stop(self):
+        """Stop the speculative search and wait until the engine is free"""
+        with self.lock:
+            self.stopped.set()
+            if self.analysis:
+                self.analysis.stop()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+            
+    def best_move(self, board):
+        """Best move found so far for the position and its depth, or (None, 0)"""
+        return self.cache.get(chess.polyglot.zobrist_hash(board), (None, 0))
+
+# One indexing pass at a time per process, so no source is counted twice
+_position_index_lock = threading.Lock()
+
+def update_position_index(archive=None):
+    """Add newly committed archive entries (or every new source, without one) to the opening explorer"""
+    try:
+        with _position_index_lock:
+            index = PositionIndex()
+            try:
+                if archive:
+                    index.index_archive(archive)
+                else:
+                    index.index_directory('.')
+            finally:
+                index.close()
+    except Exception as e:
+        print(f"Error updating opening explorer: {e}")
+
+class ArchiveWriter:
+    """Commit saves to the game archive on a background thread, so saving never stalls a frame"""
+    def __init__(self, path=ARCHIVE_FILE, index_path=ARCHIVE_INDEX_FILE):
+        self.archive = GameArchive(path, index_path)
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        
+    def submit(self, save_data, on_indexed=None):
+        """Queue a save; on_indexed is called from the writer thread once the explorer has it"""
+        self.queue.put((save_data, on_indexed))
+        
+    def run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    break
+                save_data, on_indexed = item
+                number = self.archive.append(save_data)
+                print(f"Game saved as {ARCHIVE_PREFIX}{number}")
+                update_position_index(self.archive)
+                if on_indexed:
+                    on_indexed()
+            except Exception as e:
+                print(f"Error saving game: {e}")
+            finally:
+                self.queue.task_done()
+        self.archive.close()
+                
+    def wait(self):
+        """Block until every submitted save is committed"""
+        self.queue.join()
+        
+    def close(self):
+        """Commit the pending saves and stop the thread"""
+        self.queue.put(None)
+        self.thread.join()
+
+def serialize_event(event):
+    """Convert a pygame event to a JSON-friendly dict"""
+    data = {'type': event.type}
+    for name in RECORDED_EVENTS[event.type]:
+        value = getattr(event, name)
+        data[name] = list(value) if isinstance(value, tuple) else value
+    return data
+
+def deserialize_event(data):
+    """Rebuild a pygame event from serialize_event output"""
+    attributes = {name: tuple(value) if isinstance(value, list) else value
+                  for name, value in data.items() if name != 'type'}
+    return pygame.event.Event(data['type'], attributes)
+
+class InputRecorder:
+    """Capture the event stream, frame timestamps and engine replies of a game"""
+    def __init__(self, game, seed):
+        self.meta = {
+            'theme': game.theme,
+            'difficulty': game.difficulty,
+            'time_control': game.time_control,
+            'seed': seed,
+            'fen': game.board.fen(),
+            'record': game.game_record.to_dict(),  # A loaded game starts with its moves so far
+            'window': list(game.screen.get_size())
+        }
+        self.ticks = []
+        self.events = {}
+        self.engine_moves = []
+        
+    def record_frame(self, frame, ticks, events):
+        """Record the timestamp and the relevant events of a frame"""
+        self.ticks.append(ticks)
+        recorded = [serialize_event(event) for event in events if event.type in RECORDED_EVENTS]
+        if recorded:
+            self.events[frame] = recorded
+            
+    def record_engine_move(self, frame, move):
+        """Record the engine reply applied on a frame"""
+        self.engine_moves.append([frame, move.uci()])
+        
+    def save(self, board):
+        """Write the recording to a file and return its name"""
+        start = self.ticks[0] if self.ticks else 0
+        recording = {
+            'meta': dict(self.meta, final_fen=board.fen()),
+            'ticks': [ticks - start for ticks in self.ticks],
+            'events': {str(frame): events for frame, events in self.events.items()},
+            'engine_moves': self.engine_moves
+        }
+        
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f'chess_recording_{timestamp}.json'
+        with open(filename, 'w') as f:
+            json.dump(recording, f)
+        return filename
+
+class ReplayDriver:
+    """Feed a recording back into ChessGame and stand in for the chess engine"""
+    def __init__(self, recording):
+        self.meta = recording['meta']
+        self.ticks = recording['ticks']
+        self.events = {int(frame): events for frame, events in recording['events'].items()}
+        self.engine_moves = recording['engine_moves']
+        self.engine_calls = 0
+        self.replies_applied = 0
+        
+    def frame_ticks(self, frame):
+        """Recorded timestamp of a frame"""
+        return self.ticks[min(frame, len(self.ticks) - 1)] if self.ticks else 0
+        
+    def events_for(self, frame):
+        """Events of a frame; the game is closed once the recording runs out"""
+        if frame >= len(self.ticks):
+            return [pygame.event.Event(pygame.QUIT)]
+        return [deserialize_event(data) for data in self.events.get(frame, [])]
+        
+    def engine_move_due(self, frame):
+        """Whether the next engine reply was applied on or before this frame"""
+        if self.replies_applied >= len(self.engine_moves):
+            # The recording ended (or the search was taken back) before another reply
+            return False
+        return self.engine_moves[self.replies_applied][0] <= frame
+        
+    def reply_applied(self):
+        self.replies_applied += 1
+        
+    def play(self, board, limit):
+        """Engine stub: return the next recorded reply (cancelled searches use none)"""
+        self.engine_calls += 1
+        if self.replies_applied >= len(self.engine_moves):
+            # A search taken back before it finished has no recorded reply
+            return chess.engine.PlayResult(None, None)
+        move = chess.Move.from_uci(self.engine_moves[self.replies_applied][1])
+        return chess.engine.PlayResult(move, None)
+        
+    def quit(self):
+        pass
+
 class ChessGame:
-    def __init__(self, theme='classic', difficulty=1):
-        self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    def __init__(self, theme='classic', difficulty=1, time_control=None, replay=None, puzzle=None,
+                 archive_writer=None):
+        # Keep whatever size the window already has
+        surface = pygame.display.get_surface()
+        window_size = surface.get_size() if surface else (WIDTH, HEIGHT)
+        self.screen = pygame.display.set_mode(window_size, pygame.RESIZABLE)
         pygame.display.set_caption("Chess Game")
+        self.layout = BoardLayout(*window_size)
+        self.piece_cache = SurfaceCache()
+        self.board_cache = SurfaceCache()
         self.board = chess.Board()
         self.selected_square = None
         self.player_turn = True
         self.possible_moves = set()
-        self.move_history = []
-        self.captured_pieces = {'white': [], 'black': []}
+        self.game_record = GameRecord()
         self.theme = theme
         self.difficulty = difficulty
+        self.time_control = time_control
+        self.chess_clock = None
+        if time_control:
+            base, increment = time_control
+            self.chess_clock = ChessClock(base * 1000, increment * 1000)
         self.clock = pygame.time.Clock()
         self.promotion_menu = None
         self.pending_promotion = None
         self.game_message = None
         self.font = pygame.font.SysFont('Arial', 24)
         self.load_assets()
+        self.apply_layout()
+        
+        # Input recording and replay
+        self.recorder = None
+        self.replay = replay
+        self.archive_writer = archive_writer  # Saves with the S key and at game end when set
+        self.frame = -1
+        self.frame_ticks = 0
+        self.frame_started = None
+        self.frame_times = [] if replay else None
         
         # Initialize chess engine
         self.engine = None
         self.engine_thread = None
         self.engine_thinking = False
         self.engine_move = None
-        self.init_chess_engine()
+        self.engine_move_ticks = 0
+        # Searches are cancelled when the line they were started for is taken back
+        self.engine_lock = threading.Lock()
+        self.engine_analysis = None
+        self.engine_cancelled = threading.Event()
+        self.search_generation = 0
+        
+        # Puzzle mode: the computer answers with the solution line
+        self.puzzle_solution = None
+        self.puzzle_ply = 0
+        self.puzzle_solved = False
+        if puzzle:
+            self.board, self.puzzle_solution = puzzle.oriented()
+            self.game_record = GameRecord(self.board.fen())
+        
+        if replay:
+            # The replay driver answers with the recorded engine moves
+            self.engine = replay
+            self.engine_depth = None
+            self.engine_time = None
+        else:
+            self.init_chess_engine()
+        
+        # Initialize endgame tablebases
+        self.tablebase = None
+        self.tablebase_pieces = 0
+        self.metrics = {'tb_probes': 0, 'tb_hits': 0, 'tb_probe_ms': 0.0, 'tb_probe_ms_total': 0.0}
+        self.init_tablebase()
+        
+        # Hints search in the background on the player's turn
+        self.hint_engine = None
+        if isinstance(self.engine, chess.engine.SimpleEngine):
+            self.hint_engine = HintEngine(self.engine)
+        self.hint_searching = False
+        self.show_hint = False
+        self.hint_button = Button(0, 0, 70, 40, "Hint", 24)
+        
+        # Moves queued while the computer is thinking, played as soon as it replies
+        self.premoves = []
+        
+        # Position navigation and takeback
+        self.view_ply = None  # Ply shown on the board, or None for the live position
+        self.view_board = None
+        self.history_rows = []
+        self.nav_buttons = {
+            'first': Button(0, 0, 40, 40, "|<", 24),
+            'prev': Button(0, 0, 40, 40, "<", 24),
+            'next': Button(0, 0, 40, 40, ">", 24),
+            'last': Button(0, 0, 40, 40, ">|", 24),
+            'takeback': Button(0, 0, 70, 40, "Undo", 24),
+        }
+        
+        # Opening explorer
+        self.explorer = None
+        self.explorer_results = {}
+        self.init_explorer()
         
         # Set up for game messages
         self.game_message = None
@@ -191,28 +1689,14 @@ class ChessGame:
     def init_chess_engine(self):
         """Initialize the chess engine (Stockfish)"""
         try:
-            # Adjustable difficulty parameters
-            difficulty_settings = [
-                {"Skill Level": 0, "Depth": 1, "Time": 0.1},   # Easy
-                {"Skill Level": 10, "Depth": 5, "Time": 0.5},  # Medium
-                {"Skill Level": 20, "Depth": 10, "Time": 1.0}  # Hard
-            ]
-            
-            # Set paths for different operating systems
-            stockfish_paths = {
-                'posix': './stockfish',       # Linux/Mac
-                'nt': './stockfish.exe',      # Windows
-                'fallback': 'stockfish'       # Try system PATH
-            }
-            
             # Try to find stockfish
-            stockfish_path = stockfish_paths.get(os.name, stockfish_paths['fallback'])
+            stockfish_path = find_stockfish_path()
             
             # Initialize the chess engine
             self.engine = chess.engine.SimpleEngine.popen_uci(stockfish_path)
             
             # Set difficulty
-            settings = difficulty_settings[self.difficulty]
+            settings = DIFFICULTY_SETTINGS[self.difficulty]
             self.engine.configure({"Skill Level": settings["Skill Level"]})
             self.engine_depth = settings["Depth"]
             self.engine_time = settings["Time"]
@@ -223,26 +1707,103 @@ class ChessGame:
             print("Falling back to random move selection")
             self.engine = None
             
+    def init_tablebase(self):
+        """Open the Syzygy tablebases if a tablebase directory is available"""
+        # Only Hard and the random fallback play perfect endgames; Easy and
+        # Medium are meant to make mistakes.
+        if self.engine is not None and self.difficulty != 2:
+            return
+        if self.replay:
+            return
+        if not os.path.isdir(SYZYGY_PATH):
+            return
+        
+        try:
+            tablebase = chess.syzygy.open_tablebase(SYZYGY_PATH, max_fds=SYZYGY_MAX_FDS)
+            # Table names look like "KRPvKR", so the piece count is the name length minus the 'v'
+            tablenames = set(tablebase.wdl) & set(tablebase.dtz)
+            if not tablenames:
+                tablebase.close()
+                return
+            self.tablebase = tablebase
+            self.tablebase_pieces = max(len(name) - 1 for name in tablenames)
+            print(f"Syzygy tablebases loaded from {SYZYGY_PATH} (up to {self.tablebase_pieces} pieces)")
+        except Exception as e:
+            print(f"Error loading tablebases: {e}")
+            self.tablebase = None
+            
+    def init_explorer(self):
+        """Open the opening explorer index and add any new saved games in the background"""
+        if self.replay:
+            return
+        try:
+            self.explorer = PositionIndex()
+        except Exception as e:
+            print(f"Error opening opening explorer: {e}")
+            self.explorer = None
+            return
+        # A large PGN journal takes a while to index; show its games once they are in
+        threading.Thread(target=self.index_saved_games, daemon=True).start()
+        
+    def index_saved_games(self):
+        update_position_index()
+        self.refresh_explorer()
+        
+    def refresh_explorer(self):
+        """Drop the cached explorer results once the index has changed (any thread)"""
+        self.explorer_results = {}
+            
+    def probe_tablebase(self, board):
+        """Return the tablebase-best move for the position, or None if it is not covered"""
+        if self.tablebase is None or chess.popcount(board.occupied) > self.tablebase_pieces:
+            return None
+        
+        start = time.perf_counter()
+        best_move = None
+        best_key = None
+        try:
+            for move in board.legal_moves:
+                zeroing = board.is_zeroing(move)
+                board.push(move)
+                try:
+                    if board.is_checkmate():
+                        key = (3, 0)
+                    else:
+                        # WDL/DTZ are from the opponent's point of view after our move
+                        wdl = self.tablebase.get_wdl(board)
+                        dtz = self.tablebase.get_dtz(board)
+                        if wdl is None or dtz is None:
+                            return None
+                        if wdl < 0:
+                            # Winning: prefer zeroing moves, then the fastest conversion
+                            key = (-wdl, int(zeroing), -abs(dtz))
+                        elif wdl > 0:
+                            # Losing: resist as long as possible
+                            key = (-wdl, 0, abs(dtz))
+                        else:
+                            key = (0, 0, 0)
+                finally:
+                    board.pop()
+                if best_key is None or key > best_key:
+                    best_key = key
+                    best_move = move
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.metrics['tb_probes'] += 1
+            self.metrics['tb_probe_ms'] = elapsed
+            self.metrics['tb_probe_ms_total'] += elapsed
+        
+        if best_move is not None:
+            self.metrics['tb_hits'] += 1
+        return best_move
+            
     def record_move(self, move):
         """Record a move in the move history"""
-        piece = self.board.piece_at(move.from_square)
-        capture = self.board.piece_at(move.to_square)
-        move_san = self.board.san(move)
-        turn_number = len(self.move_history) // 2 + 1
-        
-        if capture:
-            captured_color = 'white' if capture.color == chess.WHITE else 'black'
-            self.captured_pieces[captured_color].append(capture.symbol())
-            
-        self.move_history.append({
-            'turn': turn_number,
-            'move': move_san,
-            'player': 'White' if self.board.turn == chess.BLACK else 'Black'
-        })
+        self.game_record.append(move)
         
     def draw_move_history(self):
         """Draw the move history on the right side of the board"""
-        start_x = BOARD_SIZE + 10
+        start_x = self.layout.panel_x
         start_y = 10
         
         # Draw header
@@ -250,36 +1811,145 @@ class ChessGame:
         self.screen.blit(header, (start_x, start_y))
         
         # Draw moves
-        for i, move in enumerate(self.move_history[-10:]):  # Show last 10 moves
+        entries = self.game_record.history(8)  # Show last 8 moves
+        recorded = min(len(entries), len(self.game_record))
+        first_ply = len(self.game_record) - recorded
+        legacy = len(entries) - recorded
+        self.history_rows = []
+        for i, move in enumerate(entries):
+            # Clicking a move shows the position after it (older saves have no positions)
+            ply = first_ply + (i - legacy) + 1 if i >= legacy else None
+            row = pygame.Rect(start_x, start_y + 30 + (i * 25), self.layout.width - start_x, 25)
+            self.history_rows.append((row, ply))
+            if ply is not None and ply == self.view_ply:
+                pygame.draw.rect(self.screen, MOVE_HIGHLIGHT_COLOR, row)
             text = f"{move['turn']}. {move['player']}: {move['move']}"
             move_text = self.font.render(text, True, TEXT_COLOR)
-            self.screen.blit(move_text, (start_x, start_y + 30 + (i * 25)))
+            self.screen.blit(move_text, row.topleft)
+
+    def draw_clocks(self):
+        """Draw both clocks between the move history and the captured pieces"""
+        if not self.chess_clock:
+            return
+        start_x = self.layout.panel_x
+        start_y = 250
+        now = self.current_ticks()
+        
+        for i, (color, name) in enumerate(((chess.WHITE, "White"), (chess.BLACK, "Black"))):
+            remaining = self.chess_clock.remaining_ms(color, now)
+            if self.chess_clock.running == color:
+                text_color = (255, 0, 0) if remaining < CLOCK_LOW_TIME_MS else (0, 120, 0)
+            else:
+                text_color = TEXT_COLOR
+            clock_text = self.font.render(f"{name} {ChessClock.format_ms(remaining)}", True, text_color)
+            self.screen.blit(clock_text, (start_x + i * 160, start_y))
 
     def draw_captured_pieces(self):
         """Draw captured pieces below the move history"""
-        start_x = BOARD_SIZE + 10
+        start_x = self.layout.panel_x
         start_y = 300
         
         # Draw white captured pieces
         white_text = self.font.render("White captured:", True, TEXT_COLOR)
         self.screen.blit(white_text, (start_x, start_y))
-        captured_white = " ".join(self.captured_pieces['white'])
+        captured_pieces = self.game_record.captured(self.view_ply)
+        captured_white = " ".join(captured_pieces['white'])
         white_pieces = self.font.render(captured_white, True, TEXT_COLOR)
         self.screen.blit(white_pieces, (start_x, start_y + 25))
         
         # Draw black captured pieces
         black_text = self.font.render("Black captured:", True, TEXT_COLOR)
         self.screen.blit(black_text, (start_x, start_y + 60))
-        captured_black = " ".join(self.captured_pieces['black'])
+        captured_black = " ".join(captured_pieces['black'])
         black_pieces = self.font.render(captured_black, True, TEXT_COLOR)
         self.screen.blit(black_pieces, (start_x, start_y + 85))
 
+    def update_hint_search(self):
+        """Start the speculative hint search as soon as it is the player's turn"""
+        if self.hint_engine and not self.hint_searching and self.player_turn and not self.board.is_game_over():
+            self.hint_engine.start(self.board)
+            self.hint_searching = True
+            
+    def stop_hint_search(self):
+        """Stop speculating once the player has moved"""
+        if self.hint_engine and self.hint_searching:
+            self.hint_engine.stop()
+        self.hint_searching = False
+        self.show_hint = False
+        
+    def draw_hint(self):
+        """Draw the best move found so far once a hint was requested"""
+        start_x = self.layout.panel_x
+        if not self.show_hint or not self.player_turn or self.view_ply is not None:
+            return
+        if self.hint_engine is None:
+            text = "Hints need the chess engine"
+            move = None
+        else:
+            move, depth = self.hint_engine.best_move(self.board)
+            text = f"Hint: {self.board.san(move)} (depth {depth})" if move else "Searching for a hint..."
+        hint_text = self.font.render(text, True, TEXT_COLOR)
+        self.screen.blit(hint_text, (start_x, self.layout.hint_y))
+        if move:
+            self.draw_arrow(move.from_square, move.to_square, HINT_ARROW_COLOR)
+            
+    def draw_arrow(self, from_square, to_square, color):
+        """Draw an arrow between the centers of two squares"""
+        square_size = self.layout.square_size
+        
+        def center(square):
+            col = chess.square_file(square)
+            row = 7 - chess.square_rank(square)
+            return pygame.math.Vector2(col * square_size + square_size / 2,
+                                       row * square_size + square_size / 2)
+        
+        start, end = center(from_square), center(to_square)
+        direction = (end - start).normalize()
+        normal = pygame.math.Vector2(-direction.y, direction.x)
+        head_length = square_size * 0.4
+        head_base = end - direction * head_length
+        pygame.draw.line(self.screen, color, start, head_base, max(3, square_size // 8))
+        pygame.draw.polygon(self.screen, color, [
+            end,
+            head_base + normal * head_length * 0.6,
+            head_base - normal * head_length * 0.6
+        ])
+
+    def draw_opening_explorer(self):
+        """Draw the moves previously played from this position next to the captured pieces"""
+        rows = self.layout.explorer_rows
+        if self.explorer is None or not rows:
+            return
+        start_x = self.layout.panel_x
+        start_y = self.layout.EXPLORER_Y
+        
+        board = self.display_board()
+        key = PositionIndex.position_key(board)
+        cache = self.explorer_results  # Replaced, not cleared, when the index changes
+        if key not in cache:
+            if len(cache) > 1000:
+                cache.clear()
+            cache[key] = [
+                (board.san(move), games, white, draws, black)
+                for move, games, white, draws, black in self.explorer.lookup(board)
+            ]
+        results = cache[key]
+        if not results:
+            return
+        
+        header = self.font.render("Opening explorer", True, TEXT_COLOR)
+        self.screen.blit(header, (start_x, start_y))
+        for i, (san, games, white, draws, black) in enumerate(results[:rows]):
+            text = f"{san}: {games} (+{white} ={draws} -{black})"
+            line = self.font.render(text, True, TEXT_COLOR)
+            self.screen.blit(line, (start_x, start_y + 30 + (i * self.layout.EXPLORER_ROW_HEIGHT)))
+
     def show_game_message(self, message):
         """Display a game message"""
         self.game_message = {
             'text': message,
             'color': (255, 215, 0),  # Gold color for the message
-            'start_time': pygame.time.get_ticks(),
+            'start_time': self.get_ticks(),
             'background_colors': [
                 (30, 30, 100),  # Deep blue
                 (100, 30, 30),  # Deep red
@@ -291,10 +1961,11 @@ class ChessGame:
     def draw_game_message(self):
         """Draw the game message if it exists"""
         if self.game_message:
-            current_time = pygame.time.get_ticks()
+            width, height = self.layout.width, self.layout.height
+            current_time = self.get_ticks()
             if current_time - self.game_message['start_time'] < 5000:  # Display for 5 seconds
                 # Create gradient background
-                gradient_rect = pygame.Surface((WIDTH, HEIGHT))
+                gradient_rect = pygame.Surface((width, height))
             
                 # Animate background colors
                 time_factor = (current_time - self.game_message['start_time']) / 1000  # Time in seconds
@@ -304,15 +1975,15 @@ class ChessGame:
                 color1 = self.game_message['background_colors'][color_index]
                 color2 = self.game_message['background_colors'][next_color_index]
             
-                for i in range(HEIGHT):
+                for i in range(height):
                     # Create smooth gradient transition
-                    factor = i / HEIGHT
+                    factor = i / height
                     current_color = (
                         int(color1[0] * (1 - factor) + color2[0] * factor),
                         int(color1[1] * (1 - factor) + color2[1] * factor),
                         int(color1[2] * (1 - factor) + color2[2] * factor)
                     )
-                    pygame.draw.line(gradient_rect, current_color, (0, i), (WIDTH, i))
+                    pygame.draw.line(gradient_rect, current_color, (0, i), (width, i))
             
                 # Add some transparency to the gradient
                 gradient_rect.set_alpha(200)
@@ -321,7 +1992,7 @@ class ChessGame:
                 # Draw main message
                 font_large = pygame.font.SysFont('Arial', 72, bold=True)
                 text_large = font_large.render(self.game_message['text'], True, (255, 255, 255))
-                text_rect_large = text_large.get_rect(center=(WIDTH // 2, HEIGHT // 2))
+                text_rect_large = text_large.get_rect(center=(width // 2, height // 2))
             
                 # Add glow effect
                 glow_surf = pygame.Surface((text_rect_large.width + 20, text_rect_large.height + 20))
@@ -344,13 +2015,13 @@ class ChessGame:
                 # Add additional message
                 font_small = pygame.font.SysFont('Arial', 36)
                 text_small = font_small.render("Press any key to continue...", True, (255, 255, 255))
-                text_rect_small = text_small.get_rect(center=(WIDTH // 2, HEIGHT * 3 // 4))
+                text_rect_small = text_small.get_rect(center=(width // 2, height * 3 // 4))
                 self.screen.blit(text_small, text_rect_small)
             
                 # Add some particle effects
                 for _ in range(20):
-                    x = random.randint(0, WIDTH)
-                    y = random.randint(0, HEIGHT)
+                    x = random.randint(0, width)
+                    y = random.randint(0, height)
                     size = random.randint(2, 6)
                     color = random.choice(self.game_message['background_colors'])
                     pygame.draw.circle(self.screen, color, (x, y), size)
@@ -368,56 +2039,218 @@ class ChessGame:
             self.pending_promotion = (from_square, to_square)
             col = chess.square_file(to_square)
             row = 7 - chess.square_rank(to_square)
-            self.promotion_menu = PromotionMenu(self.screen, (col, row), piece.color == chess.WHITE)
+            self.promotion_menu = PromotionMenu(self.screen, (col, row), piece.color == chess.WHITE,
+                                                self.layout)
             return False
         else:
             move = chess.Move(from_square, to_square)
             if move in self.board.legal_moves:
-                self.record_move(move)
-                self.board.push(move)
-                return True
+                return self.play_player_move(move)
         return False
+        
+    def play_player_move(self, move):
+        """Play a legal move for the player and hand the turn to the computer"""
+        if self.puzzle_solution and not self.check_puzzle_move(move):
+            self.show_game_message("Wrong move! Try again")
+            return False
+        
+        self.stop_hint_search()
+        self.record_move(move)
+        self.board.push(move)
+        self.player_turn = False
+        if self.chess_clock:
+            self.chess_clock.press(self.current_ticks())
+        
+        # Check if the player put the AI in check or checkmate
+        if self.board.is_checkmate():
+            self.show_game_message("Checkmate! White wins!")
+        elif self.board.is_check():
+            self.show_game_message("Check!")
+        return True
+        
+    def premove_board(self):
+        """The position the next premove is chosen from: the live board with the queue played for White"""
+        board = self.board.copy(stack=False)
+        for move in self.premoves:
+            # Queued moves may land on White's own pieces (recaptures), which push would
+            # take for castling, so the pieces are moved by hand
+            piece = board.remove_piece_at(move.from_square)
+            if move.promotion:
+                piece = chess.Piece(move.promotion, chess.WHITE)
+            board.set_piece_at(move.to_square, piece)
+            if piece.piece_type == chess.KING:
+                if chess.square_distance(move.from_square, move.to_square) == 2:
+                    rook_from, rook_to = ((chess.H1, chess.F1) if move.to_square == chess.G1
+                                          else (chess.A1, chess.D1))
+                    board.set_piece_at(rook_to, board.remove_piece_at(rook_from))
+                board.castling_rights &= ~chess.BB_RANK_1
+            board.castling_rights &= ~chess.BB_SQUARES[move.from_square]
+        board.turn = chess.WHITE
+        return board
+        
+    def premove_targets(self, board, square):
+        """Squares White's piece on square could reach after any computer reply.
+        
+        The reply may capture on a square or clear a line, so Black's pieces do not block
+        and White's own pieces are targets too (for recaptures); pawns may always capture.
+        """
+        piece = board.piece_at(square)
+        if not piece or piece.color != chess.WHITE:
+            return set()
+        own = board.occupied_co[chess.WHITE]
+        if piece.piece_type == chess.PAWN:
+            targets = chess.BB_PAWN_ATTACKS[chess.WHITE][square]
+            step = square + 8
+            if step < 64 and not own & chess.BB_SQUARES[step]:
+                targets |= chess.BB_SQUARES[step]
+                if chess.square_rank(square) == 1 and not own & chess.BB_SQUARES[square + 16]:
+                    targets |= chess.BB_SQUARES[square + 16]
+            return set(chess.SquareSet(targets))
+        
+        white_only = chess.BaseBoard(None)
+        for other in chess.SquareSet(own):
+            white_only.set_piece_at(other, board.piece_at(other))
+        targets = set(white_only.attacks(square))
+        if piece.piece_type == chess.KING and square == chess.E1:
+            if board.has_kingside_castling_rights(chess.WHITE) and not own & (chess.BB_F1 | chess.BB_G1):
+                targets.add(chess.G1)
+            if (board.has_queenside_castling_rights(chess.WHITE) and
+                    not own & (chess.BB_B1 | chess.BB_C1 | chess.BB_D1)):
+                targets.add(chess.C1)
+        return targets
+        
+    def queue_premove(self, board, from_square, to_square):
+        """Queue a move for after the computer's reply; promotions become queens"""
+        # The computer's reply is unknown, so any square the piece could reach is allowed for now;
+        # play_premove checks the move once the reply is on the board
+        if to_square not in self.premove_targets(board, from_square):
+            return
+        move = chess.Move(from_square, to_square)
+        if (board.piece_type_at(from_square) == chess.PAWN and
+                chess.square_rank(to_square) in (0, 7)):
+            move.promotion = chess.QUEEN
+        self.premoves.append(move)
+            
+    def play_premove(self):
+        """Play the first queued premove, dropping the queue if the position no longer allows it"""
+        if not self.premoves:
+            return
+        move = self.premoves.pop(0)
+        if self.board.is_game_over() or move not in self.board.legal_moves or not self.play_player_move(move):
+            self.premoves = []
+            
+    def check_puzzle_move(self, move):
+        """Whether a move follows the puzzle solution, advancing the solution if so"""
+        expected = self.puzzle_solution[self.puzzle_ply]
+        if move != expected:
+            # Any mate solves the puzzle
+            board = self.board.copy(stack=False)
+            board.push(move)
+            if not board.is_checkmate():
+                return False
+        self.puzzle_ply += 1
+        if move != expected or self.puzzle_ply >= len(self.puzzle_solution):
+            self.puzzle_solved = True
+        return True
 
-    def engine_think(self):
+    def engine_think(self, generation):
         """Run the engine calculation in a separate thread"""
-        self.engine_thinking = True
-        self.engine_move = None
+        board = self.board.copy()
+        move = None
         
         try:
-            if self.engine:
-                # Get the best move from the engine
-                result = self.engine.play(
-                    self.board,
-                    chess.engine.Limit(depth=self.engine_depth, time=self.engine_time)
-                )
-                self.engine_move = result.move
+            # Play straight from the tablebase when the position is covered
+            tablebase_move = None if self.puzzle_solution else self.probe_tablebase(board.copy())
+            if self.puzzle_solution:
+                # Answer with the puzzle's solution line
+                move = self.puzzle_solution[self.puzzle_ply]
+            elif tablebase_move:
+                move = tablebase_move
+            elif self.engine:
+                # Get the best move from the engine, letting it manage its own time on the clock
+                if self.chess_clock:
+                    limit = self.chess_clock.engine_limit(self.current_ticks(), self.engine_depth)
+                else:
+                    limit = chess.engine.Limit(depth=self.engine_depth, time=self.engine_time)
+                move = self.engine_search(board, limit)
             else:
                 # Fallback to random move if engine is not available
-                legal_moves = list(self.board.legal_moves)
+                legal_moves = list(board.legal_moves)
                 if legal_moves:
-                    # Simulate thinking time
-                    time.sleep(0.5)
-                    self.engine_move = random.choice(legal_moves)
+                    # Simulate thinking time (cut short by a takeback)
+                    if not self.engine_cancelled.wait(0.5):
+                        move = random.choice(legal_moves)
         except Exception as e:
             print(f"Engine error: {e}")
             # Fallback to random move
-            legal_moves = list(self.board.legal_moves)
+            legal_moves = list(board.legal_moves)
             if legal_moves:
-                self.engine_move = random.choice(legal_moves)
+                move = random.choice(legal_moves)
         
+        # The move of a cancelled search belongs to a line that was taken back
+        if generation == self.search_generation:
+            self.engine_move = move
+            self.engine_move_ticks = self.current_ticks()
         self.engine_thinking = False
-
+        
+    def engine_search(self, board, limit):
+        """Get the engine's move through a search the UI thread can stop"""
+        if self.replay:
+            return self.engine.play(board, limit).move
+        with self.engine_lock:
+            if self.engine_cancelled.is_set():
+                return None
+            analysis = self.engine.analysis(board, limit)
+            self.engine_analysis = analysis
+        try:
+            return analysis.wait().move
+        finally:
+            with self.engine_lock:
+                self.engine_analysis = None
+                
+    def cancel_engine_search(self):
+        """Abandon the engine's search, if any, and wait until the engine is free"""
+        self.search_generation += 1
+        with self.engine_lock:
+            self.engine_cancelled.set()
+            if self.engine_analysis:
+                self.engine_analysis.stop()
+        if self.engine_thread:
+            self.engine_thread.join()
+            self.engine_thread = None
+        self.engine_thinking = False
+        self.engine_move = None
+        
     def ai_move(self):
         """Start the AI move calculation in a separate thread"""
         if not self.engine_thinking and self.engine_thread is None:
-            self.engine_thread = threading.Thread(target=self.engine_think)
+            # Mark the search as started before the thread runs, so this frame does not see it finished
+            self.engine_thinking = True
+            self.engine_move = None
+            self.engine_cancelled.clear()
+            self.engine_thread = threading.Thread(target=self.engine_think, args=(self.search_generation,))
             self.engine_thread.start()
         
+        # A replay applies the reply on the same frame as the recording did
+        if self.replay and self.engine_thread:
+            if not self.replay.engine_move_due(self.frame):
+                return False
+            self.engine_thread.join()
+        
         # Check if the engine has finished thinking
         if self.engine_thread and not self.engine_thinking:
             if self.engine_move:
+                if self.recorder:
+                    self.recorder.record_engine_move(self.frame, self.engine_move)
+                if self.replay:
+                    self.replay.reply_applied()
+                if self.puzzle_solution:
+                    self.puzzle_ply += 1
                 self.record_move(self.engine_move)
                 self.board.push(self.engine_move)
+                if self.chess_clock:
+                    # Stop the engine's time when it found the move, not when the frame picked it up
+                    self.chess_clock.press(self.frame_ticks if self.replay else self.engine_move_ticks)
                 self.engine_move = None
             
             # Reset thread
@@ -426,150 +2259,260 @@ class ChessGame:
         
         return False
     
+    def take_back(self):
+        """Undo the player's last move (and the computer's reply), cancelling any search"""
+        if self.puzzle_solution or self.promotion_menu:
+            return
+        plies = 2 if self.player_turn else 1
+        if len(self.game_record) < plies:
+            return
+        
+        self.cancel_engine_search()
+        self.stop_hint_search()
+        for _ in range(plies):
+            self.board.pop()
+        self.game_record.truncate(len(self.game_record) - plies)
+        
+        self.player_turn = True
+        self.selected_square = None
+        self.possible_moves = set()
+        self.premoves = []
+        self.view_ply = None
+        if self.chess_clock:
+            now = self.current_ticks()
+            self.chess_clock.stop(now)
+            self.chess_clock.start(self.board.turn, now)
+            
+    def navigate(self, action):
+        """Move the viewed position (first/prev/next/last) or take back a move"""
+        if action == 'takeback':
+            self.take_back()
+            return
+        
+        last = len(self.game_record)
+        current = last if self.view_ply is None else self.view_ply
+        target = {'first': 0, 'prev': current - 1, 'next': current + 1, 'last': last}[action]
+        self.view_ply_at(max(0, min(target, last)))
+        
+    def view_ply_at(self, ply):
+        """Show the position after ply moves; the last ply is the live position"""
+        self.selected_square = None
+        self.possible_moves = set()
+        if ply >= len(self.game_record):
+            self.view_ply = None
+            self.view_board = None
+        else:
+            self.view_ply = ply
+            self.view_board = self.game_record.board_at(ply)
+            
+    def display_board(self):
+        """Board to draw: the viewed position while navigating, otherwise the live one"""
+        return self.view_board if self.view_ply is not None else self.board
+        
+    def handle_control_event(self, event):
+        """Handle the hint, navigation, takeback and save controls; True if the event was used"""
+        if self.hint_button.handle_event(event) or (event.type == pygame.KEYDOWN and event.key == pygame.K_h):
+            self.show_hint = self.player_turn
+            return True
+        for name, button in self.nav_buttons.items():
+            if button.handle_event(event):
+                self.navigate(name)
+                return True
+        if event.type == pygame.KEYDOWN and event.key in NAVIGATION_KEYS:
+            self.navigate(NAVIGATION_KEYS[event.key])
+            return True
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_s and self.archive_writer:
+            # Only queues the save; the writer thread compresses and commits it
+            save_game(self.board, self.game_record, self.archive_writer, self.refresh_explorer)
+            self.show_game_message("Game saved")
+            return True
+        if event.type == pygame.MOUSEBUTTONDOWN:
+            for rect, ply in self.history_rows:
+                if ply is not None and rect.collidepoint(event.pos):
+                    self.view_ply_at(ply)
+                    return True
+        return False
+        
+    def draw_controls(self):
+        """Draw the hint, navigation and takeback buttons along the bottom of the side panel"""
+        x = self.layout.panel_x
+        y = self.layout.controls_y
+        for button in [self.hint_button] + list(self.nav_buttons.values()):
+            button.rect.topleft = (x, y)
+            button.draw(self.screen)
+            x += button.rect.width + 5
+            
     def draw_thinking_indicator(self):
         """Draw an indicator that the engine is thinking"""
         if self.engine_thinking:
-            start_x = BOARD_SIZE + 10
+            start_x = self.layout.panel_x
             start_y = 400
             
-            current_time = pygame.time.get_ticks()
+            current_time = self.get_ticks()
             dots = "." * (1 + (current_time // 500) % 3)
             
             thinking_text = self.font.render(f"Engine thinking{dots}", True, (255, 100, 100))
             self.screen.blit(thinking_text, (start_x, start_y))
+            
+    def draw_engine_metrics(self):
+        """Draw tablebase probe statistics below the thinking indicator"""
+        if self.tablebase is None or not self.metrics['tb_probes']:
+            return
+        start_x = self.layout.panel_x
+        start_y = 425
+        
+        text = f"Tablebase: {self.metrics['tb_hits']} hits, {self.metrics['tb_probe_ms']:.1f} ms"
+        metrics_text = self.font.render(text, True, TEXT_COLOR)
+        self.screen.blit(metrics_text, (start_x, start_y))
+        
+    def print_engine_metrics(self):
+        """Print a summary of the tablebase probes made during the game"""
+        probes = self.metrics['tb_probes']
+        if probes:
+            average = self.metrics['tb_probe_ms_total'] / probes
+            print(f"Tablebase probes: {probes}, hits: {self.metrics['tb_hits']}, "
+                  f"avg latency: {average:.2f} ms")
 
     def load_assets(self):
         """Load chess piece images"""
         try:
-            self.pieces = {'white': {}, 'black': {}}
+            self.piece_images = {'white': {}, 'black': {}}
             piece_chars = 'KQRBNP'
             theme_folder = f'chess_pieces/{self.theme}'
         
             for piece in piece_chars:
-                white_path = os.path.join(theme_folder, f'white_{piece.lower()}.png')
-                black_path = os.path.join(theme_folder, f'black_{piece.lower()}.png')
-            
-                if os.path.exists(white_path):
-                    white_img = pygame.image.load(white_path)
-                    self.pieces['white'][piece] = pygame.transform.scale(
-                        white_img, (SQUARE_SIZE - 20, SQUARE_SIZE - 20)
-                    )
-                else:
-                    white_surf = pygame.Surface((SQUARE_SIZE - 20, SQUARE_SIZE - 20))
-                    white_surf.fill((255, 255, 255))
-                    pygame.draw.rect(white_surf, (0, 0, 0), white_surf.get_rect(), 2)
-                    font = pygame.font.SysFont('Arial', 36)
-                    text = font.render(piece, True, (0, 0, 0))
-                    text_rect = text.get_rect(center=white_surf.get_rect().center)
-                    white_surf.blit(text, text_rect)
-                    self.pieces['white'][piece] = white_surf
-                
-                if os.path.exists(black_path):
-                    black_img = pygame.image.load(black_path)
-                    self.pieces['black'][piece] = pygame.transform.scale(
-                        black_img, (SQUARE_SIZE - 20, SQUARE_SIZE - 20)
-                    )
-                else:
-                    black_surf = pygame.Surface((SQUARE_SIZE - 20, SQUARE_SIZE - 20))
-                    black_surf.fill((100, 100, 100))
-                    pygame.draw.rect(black_surf, (255, 255, 255), black_surf.get_rect(), 2)
-                    font = pygame.font.SysFont('Arial', 36)
-                    text = font.render(piece, True, (255, 255, 255))
-                    text_rect = text.get_rect(center=black_surf.get_rect().center)
-                    black_surf.blit(text, text_rect)
-                    self.pieces['black'][piece] = black_surf
+                for color in ('white', 'black'):
+                    path = os.path.join(theme_folder, f'{color}_{piece.lower()}.png')
+                    # Missing images are drawn as lettered squares at render time
+                    if os.path.exists(path):
+                        self.piece_images[color][piece] = pygame.image.load(path)
+                    else:
+                        self.piece_images[color][piece] = None
         except Exception as e:
             print(f"Error loading assets: {e}")
             self.create_fallback_pieces()
 
     def create_fallback_pieces(self):
         """Create basic piece representations if images can't be loaded"""
-        self.pieces = {'white': {}, 'black': {}}
-        piece_chars = 'KQRBNP'
-    
-        for piece in piece_chars:
-            # Create white pieces
-            white_surf = pygame.Surface((SQUARE_SIZE - 20, SQUARE_SIZE - 20))
-            white_surf.fill((255, 255, 255))
-            pygame.draw.rect(white_surf, (0, 0, 0), white_surf.get_rect(), 2)
-            font = pygame.font.SysFont('Arial', 36)
-            text = font.render(piece, True, (0, 0, 0))
-            text_rect = text.get_rect(center=white_surf.get_rect().center)
-            white_surf.blit(text, text_rect)
-            self.pieces['white'][piece] = white_surf
-        
-            # Create black pieces
-            black_surf = pygame.Surface((SQUARE_SIZE - 20, SQUARE_SIZE - 20))
-            black_surf.fill((100, 100, 100))
-            pygame.draw.rect(black_surf, (255, 255, 255), black_surf.get_rect(), 2)
-            text = font.render(piece, True, (255, 255, 255))
-            text_rect = text.get_rect(center=black_surf.get_rect().center)
-            black_surf.blit(text, text_rect)
-            self.pieces['black'][piece] = black_surf
+        self.piece_images = {'white': {}, 'black': {}}
+        for piece in 'KQRBNP':
+            self.piece_images['white'][piece] = None
+            self.piece_images['black'][piece] = None
 
-    def draw_board(self):
-        """Draw the chess board"""
+    def render_fallback_piece(self, piece, color, size):
+        """Draw a lettered square for a piece without an image"""
+        fill, outline = ((255, 255, 255), (0, 0, 0)) if color == 'white' else ((100, 100, 100), (255, 255, 255))
+        surf = pygame.Surface((size, size))
+        surf.fill(fill)
+        pygame.draw.rect(surf, outline, surf.get_rect(), 2)
+        font = pygame.font.SysFont('Arial', max(12, size // 2))
+        text = font.render(piece, True, outline)
+        text_rect = text.get_rect(center=surf.get_rect().center)
+        surf.blit(text, text_rect)
+        return surf
+
+    def render_pieces(self, size):
+        """Rasterize every piece sprite at the given size"""
+        pieces = {'white': {}, 'black': {}}
+        for color, images in self.piece_images.items():
+            for piece, image in images.items():
+                if image is not None:
+                    pieces[color][piece] = pygame.transform.scale(image, (size, size))
+                else:
+                    pieces[color][piece] = self.render_fallback_piece(piece, color, size)
+        return pieces
+
+    def render_board_layer(self):
+        """Draw the squares and coordinates once for the current board size"""
+        square_size = self.layout.square_size
+        board_size = self.layout.board_size
+        layer = pygame.Surface((board_size, board_size))
         for row in range(8):
             for col in range(8):
                 color = WHITE if (row + col) % 2 == 0 else BROWN
-                pygame.draw.rect(
-                    self.screen, 
-                    color, 
-                    (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
-                )
+                pygame.draw.rect(layer, color, self.layout.square_rect(row, col))
                 
                 # Draw coordinates
                 if col == 0:  # Ranks (numbers)
                     text = self.font.render(str(8 - row), True, (0, 0, 0) if color == WHITE else (255, 255, 255))
-                    self.screen.blit(text, (5, row * SQUARE_SIZE + 5))
+                    layer.blit(text, (5, row * square_size + 5))
                     
                 if row == 7:  # Files (letters)
                     text = self.font.render(chr(97 + col), True, (0, 0, 0) if color == WHITE else (255, 255, 255))
-                    self.screen.blit(text, (col * SQUARE_SIZE + SQUARE_SIZE - 20, BOARD_SIZE - 20))
-                
+                    layer.blit(text, (col * square_size + square_size - 20, board_size - 20))
+        return layer
+
+    def apply_layout(self):
+        """Fetch the board layer and piece sprites for the current layout"""
+        self.pieces = self.piece_cache.get(self.layout.piece_size,
+                                           lambda: self.render_pieces(self.layout.piece_size))
+        self.board_layer = self.board_cache.get(self.layout.board_size, self.render_board_layer)
+
+    def handle_resize(self, event):
+        """Re-layout the board after the window has been resized"""
+        self.screen = pygame.display.get_surface()
+        if self.screen.get_size() != (event.w, event.h):
+            # Replayed resize events do not resize the window by themselves
+            self.screen = pygame.display.set_mode((event.w, event.h), pygame.RESIZABLE)
+        self.layout.resize(event.w, event.h)
+        self.apply_layout()
+
+    def draw_board(self):
+        """Draw the chess board"""
+        square_size = self.layout.square_size
+        self.screen.blit(self.board_layer, (0, 0))
+        if self.view_ply is None:
+            for move in self.premoves:
+                for square in (move.from_square, move.to_square):
+                    row, col = 7 - chess.square_rank(square), chess.square_file(square)
+                    pygame.draw.rect(self.screen, PREMOVE_COLOR, self.layout.square_rect(row, col))
+        for row in range(8):
+            for col in range(8):
                 square = chess.square(col, 7 - row)
                 if self.selected_square and (row, col) == self.selected_square:
                     pygame.draw.rect(
                         self.screen,
                         SELECTED_COLOR,
-                        (col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE),
+                        self.layout.square_rect(row, col),
                         5
                     )
                 if square in self.possible_moves:
                     pygame.draw.circle(
                         self.screen,
                         MOVE_HIGHLIGHT_COLOR,
-                        (col * SQUARE_SIZE + SQUARE_SIZE // 2, 
-                        row * SQUARE_SIZE + SQUARE_SIZE // 2),
-                        15
+                        (col * square_size + square_size // 2, 
+                        row * square_size + square_size // 2),
+                        max(4, square_size // 6)
                     )
 
     def draw_pieces(self):
         """Draw the chess pieces on the board"""
+        square_size = self.layout.square_size
+        padding = self.layout.piece_padding
+        board = self.display_board()
         for row in range(8):
             for col in range(8):
                 square = chess.square(col, 7 - row)
-                piece = self.board.piece_at(square)
+                piece = board.piece_at(square)
                 if piece:
                     color = 'white' if piece.color == chess.WHITE else 'black'
                     piece_char = piece.symbol().upper()
                     if piece_char in self.pieces[color]:
                         piece_surface = self.pieces[color][piece_char]
                         piece_pos = (
-                            col * SQUARE_SIZE + 10,
-                            row * SQUARE_SIZE + 10
+                            col * square_size + padding,
+                            row * square_size + padding
                         )
                         self.screen.blit(piece_surface, piece_pos)
 
     def get_square_from_mouse(self, pos):
         """Convert mouse position to board square"""
-        x, y = pos
-        if x >= BOARD_SIZE or y >= BOARD_SIZE:
-            return None
-        return (y // SQUARE_SIZE, x // SQUARE_SIZE)
+        return self.layout.square_at(pos)
 
-    def get_possible_moves(self, square):
-        """Get all possible moves for a piece"""
+    def get_possible_moves(self, square, board=None):
+        """Get all possible moves for a piece (every square it could reach on a premove board)"""
+        if board:
+            return self.premove_targets(board, square)
         moves = set()
         for move in self.board.legal_moves:
             if move.from_square == square:
@@ -578,7 +2521,7 @@ class ChessGame:
 
     def draw_game_status(self):
         """Draw the game status (check, checkmate, etc.)"""
-        start_x = BOARD_SIZE + 10
+        start_x = self.layout.panel_x
         start_y = 450
         
         status_text = ""
@@ -597,22 +2540,68 @@ class ChessGame:
             self.screen.blit(status_surf, (start_x, start_y))
         
         # Draw whose turn it is
-        turn_text = "Your turn" if self.player_turn else "Computer's turn"
+        if self.view_ply is not None:
+            turn_text = f"Viewing ply {self.view_ply} (End to return)"
+        else:
+            turn_text = "Your turn" if self.player_turn else "Computer's turn"
+            if self.premoves:
+                turn_text += f" ({len(self.premoves)} queued)"
         turn_surf = self.font.render(turn_text, True, TEXT_COLOR)
         self.screen.blit(turn_surf, (start_x, start_y + 30))
 
+    def current_ticks(self):
+        """Milliseconds right now (the frame's recorded time during a replay)"""
+        return self.frame_ticks if self.replay else pygame.time.get_ticks()
+        
+    def get_ticks(self):
+        """Milliseconds at the start of the current frame (recorded time during a replay)"""
+        return self.frame_ticks
+        
+    def begin_frame(self):
+        """Advance the frame counter, pacing and timing the frame"""
+        if self.replay:
+            # Replays run as fast as possible and time each frame
+            self.clock.tick()
+            now = time.perf_counter()
+            if self.frame_started is not None:
+                self.frame_times.append((now - self.frame_started) * 1000)
+            self.frame_started = now
+        else:
+            self.clock.tick(60)
+        
+        self.frame += 1
+        if self.replay:
+            self.frame_ticks = self.replay.frame_ticks(self.frame)
+        else:
+            self.frame_ticks = pygame.time.get_ticks()
+            
+    def poll_events(self):
+        """Get this frame's events from pygame or the replay, recording them if needed"""
+        if self.replay:
+            events = self.replay.events_for(self.frame)
+        else:
+            events = pygame.event.get()
+        if self.recorder:
+            self.recorder.record_frame(self.frame, self.frame_ticks, events)
+        return events
+
     def run(self):
         running = True
         
         while running:
-            self.clock.tick(60)
+            self.begin_frame()
             self.screen.fill((0, 0, 0))
             self.draw_board()
             self.draw_pieces()
+            self.draw_hint()
+            self.draw_controls()
             self.draw_move_history()
+            self.draw_clocks()
             self.draw_captured_pieces()
+            self.draw_opening_explorer()
             self.draw_game_status()
             self.draw_thinking_indicator()
+            self.draw_engine_metrics()
             
             if self.promotion_menu:
                 self.promotion_menu.draw(self.pieces)
@@ -622,8 +2611,27 @@ class ChessGame:
             
             pygame.display.flip()
 
-            if self.board.is_game_over():
-                if self.board.is_checkmate():
+            if self.chess_clock and self.chess_clock.running is None and not self.board.is_game_over():
+                # The side to move starts on the clock
+                self.chess_clock.start(self.board.turn, self.current_ticks())
+            flagged = self.chess_clock.flagged(self.current_ticks()) if self.chess_clock else None
+            
+            if self.board.is_game_over() or self.puzzle_solved or flagged is not None:
+                if self.chess_clock:
+                    self.chess_clock.stop(self.current_ticks())
+                result = self.board.result(claim_draw=True)
+                    
+                if self.puzzle_solved:
+                    self.show_game_message("Puzzle solved!")
+                elif flagged is not None:
+                    winner = chess.BLACK if flagged == chess.WHITE else chess.WHITE
+                    if self.board.has_insufficient_material(winner):
+                        self.show_game_message("Time out! It's a draw!")
+                        result = '1/2-1/2'
+                    else:
+                        self.show_game_message(f"Time out! {'White' if winner == chess.WHITE else 'Black'} wins!")
+                        result = '1-0' if winner == chess.WHITE else '0-1'
+                elif self.board.is_checkmate():
                     winner = "Black" if self.board.turn == chess.WHITE else "White"
                     self.show_game_message(f"Checkmate! {winner} wins!")
                 elif self.board.is_stalemate():
@@ -632,30 +2640,39 @@ class ChessGame:
                     self.show_game_message("Draw! Insufficient material")
                 else:
                     self.show_game_message("Game Over! It's a draw!")
+                
+                # Archive the finished game, so the opening explorer counts it with its result
+                if self.archive_writer and not self.puzzle_solution:
+                    save_game(self.board, self.game_record, self.archive_writer, self.refresh_explorer, result)
                     
                 # Wait for user to press any key
                 waiting_for_key = True
                 while waiting_for_key:
-                    self.clock.tick(60)
+                    self.begin_frame()
                     self.screen.fill((0, 0, 0))
                     self.draw_board()
                     self.draw_board()
                     self.draw_pieces()
                     self.draw_move_history()
+                    self.draw_clocks()
                     self.draw_captured_pieces()
                     self.draw_game_message()
                     pygame.display.flip()
                     
-                    for event in pygame.event.get():
+                    for event in self.poll_events():
                         if event.type == pygame.QUIT:
                             running = False
                             waiting_for_key = False
+                        elif event.type == pygame.VIDEORESIZE:
+                            self.handle_resize(event)
                         elif event.type == pygame.KEYDOWN or event.type == pygame.MOUSEBUTTONDOWN:
                             waiting_for_key = False
                 
                 running = False
                 continue
 
+            self.update_hint_search()
+            
             if not self.player_turn and not self.promotion_menu:
                 if self.ai_move():
                     self.player_turn = True
@@ -664,16 +2681,43 @@ class ChessGame:
                         self.show_game_message("Checkmate! Black wins!")
                     elif self.board.is_check():
                         self.show_game_message("Check!")
+                    
+                    self.play_premove()
+                    # Refresh a pending selection for the position it now picks from
+                    if self.selected_square:
+                        row, col = self.selected_square
+                        square = chess.square(col, 7 - row)
+                        premove_board = None if self.player_turn else self.premove_board()
+                        piece = (premove_board or self.board).piece_at(square)
+                        if piece and piece.color == chess.WHITE:
+                            self.possible_moves = self.get_possible_moves(square, premove_board)
+                        else:
+                            self.selected_square = None
+                            self.possible_moves = set()
 
-            for event in pygame.event.get():
+            for event in self.poll_events():
                 if event.type == pygame.QUIT:
                     running = False
                 
+                if event.type == pygame.VIDEORESIZE:
+                    self.handle_resize(event)
+                    continue
+                
                 if self.game_message:
                     if event.type == pygame.KEYDOWN or event.type == pygame.MOUSEBUTTONDOWN:
                         self.game_message = None
                         continue
                 
+                if self.handle_control_event(event):
+                    continue
+                
+                # Right-click cancels the selection and any queued premoves
+                if event.type == pygame.MOUSEBUTTONDOWN and event.button == 3 and not self.promotion_menu:
+                    self.premoves = []
+                    self.selected_square = None
+                    self.possible_moves = set()
+                    continue
+                
                 if event.type == pygame.MOUSEBUTTONDOWN:
                     if self.promotion_menu:
                         piece = self.promotion_menu.handle_click(event.pos)
@@ -683,33 +2727,32 @@ class ChessGame:
                                             'B': chess.BISHOP, 'N': chess.KNIGHT}[piece]
                             move = chess.Move(from_square, to_square, promotion=promotion_piece)
                             if move in self.board.legal_moves:
-                                self.record_move(move)
-                                self.board.push(move)
-                                self.player_turn = False
-                                
-                                # Check if the player put the AI in check or checkmate
-                                if self.board.is_checkmate():
-                                    self.show_game_message("Checkmate! White wins!")
-                                elif self.board.is_check():
-                                    self.show_game_message("Check!")
+                                self.play_player_move(move)
                             
                             self.promotion_menu = None
                             self.pending_promotion = None
                     
-                    elif self.player_turn:
+                    elif self.view_ply is not None:
+                        # Clicking the board while browsing returns to the live position
+                        if self.get_square_from_mouse(event.pos) is not None:
+                            self.view_ply_at(len(self.game_record))
+                    
+                    else:
                         result = self.get_square_from_mouse(event.pos)
                         if result is None:
                             continue
                         
                         row, col = result
                         square = chess.square(col, 7 - row)
-                        piece = self.board.piece_at(square)
+                        # During the computer's turn clicks queue premoves
+                        premove_board = None if self.player_turn else self.premove_board()
+                        piece = (premove_board or self.board).piece_at(square)
                         
                         # If no piece is selected yet, select a piece
                         if self.selected_square is None:
                             if piece and piece.color == chess.WHITE:
                                 self.selected_square = (row, col)
-                                self.possible_moves = self.get_possible_moves(square)
+                                self.possible_moves = self.get_possible_moves(square, premove_board)
                         # If a piece is already selected, try to move it
                         else:
                             from_square = chess.square(
@@ -717,73 +2760,104 @@ class ChessGame:
                                 7 - self.selected_square[0]
                             )
                             
+                            # A premove may recapture on a friendly piece's square
+                            if premove_board and square in self.possible_moves:
+                                self.queue_premove(premove_board, from_square, square)
+                                self.selected_square = None
+                                self.possible_moves = set()
                             # If clicking on the same square or another friendly piece, change selection
-                            if square == from_square or (piece and piece.color == chess.WHITE):
+                            elif square == from_square or (piece and piece.color == chess.WHITE):
                                 if piece and piece.color == chess.WHITE:
                                     self.selected_square = (row, col)
-                                    self.possible_moves = self.get_possible_moves(square)
+                                    self.possible_moves = self.get_possible_moves(square, premove_board)
                                 else:
                                     self.selected_square = None
                                     self.possible_moves = set()
                             # Otherwise try to move to the selected square
+                            elif premove_board:
+                                self.queue_premove(premove_board, from_square, square)
+                                self.selected_square = None
+                                self.possible_moves = set()
                             else:
-                                if self.handle_move(from_square, square):
-                                    self.player_turn = False
-                                    
-                                    # Check if the player put the AI in check or checkmate
-                                    if self.board.is_checkmate():
-                                        self.show_game_message("Checkmate! White wins!")
-                                    elif self.board.is_check():
-                                        self.show_game_message("Check!")
-                                
+                                self.handle_move(from_square, square)
                                 self.selected_square = None
                                 self.possible_moves = set()
         
         # Clean up the chess engine when the game ends
+        self.stop_hint_search()
+        # A flag can fall (or the player quit) while the engine is still searching
+        self.cancel_engine_search()
         if self.engine:
             self.engine.quit()
+        if self.tablebase:
+            self.print_engine_metrics()
+            self.tablebase.close()
+        if self.explorer:
+            self.explorer.close()
 
-def save_game(board, move_history, captured_pieces):
-    """Save the current game state to a file"""
+def save_game(board, game_record, writer, on_indexed=None, result=None):
+    """Queue the current game state for the archive; the writer commits it in the background.
+    
+    result is only needed when the board cannot tell it, as after a flag-fall.
+    """
     save_data = {
         'fen': board.fen(),
-        'move_history': move_history,
-        'captured_pieces': captured_pieces
+        'record': game_record.to_dict()
     }
-    
-    timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f'chess_save_{timestamp}.json'
-    
-    with open(filename, 'w') as f:
-        json.dump(save_data, f)
-    
-    return filename
+    if result:
+        save_data['result'] = result
+    writer.submit(save_data, on_indexed)
 
 def load_game(filename):
-    """Load a game from a save file"""
-    with open(filename, 'r') as f:
-        save_data = json.load(f)
-    
-    board = chess.Board(save_data['fen'])
-    move_history = save_data['move_history']
-    captured_pieces = save_data['captured_pieces']
+    """Load a game from an archive entry (archive:N) or an older save file"""
+    if filename.startswith(ARCHIVE_PREFIX):
+        archive = GameArchive()
+        try:
+            save_data = archive.read(int(filename[len(ARCHIVE_PREFIX):]))
+        finally:
+            archive.close()
+    else:
+        with open(filename, 'r') as f:
+            save_data = json.load(f)
+    return load_save_data(save_data)
+
+def load_save_data(save_data):
+    """Rebuild the board and game record of a decoded save"""
+    if 'record' in save_data:
+        game_record = GameRecord.from_dict(save_data['record'])
+        board = game_record.board()
+    else:
+        # Older saves only have the final position and the display history
+        board = chess.Board(save_data['fen'])
+        game_record = GameRecord(board.fen(), legacy_history=save_data['move_history'],
+                                 legacy_captured=save_data['captured_pieces'])
     
-    return board, move_history, captured_pieces
+    return board, game_record
 
 class SaveGameMenu:
-    def __init__(self, screen, board, move_history, captured_pieces):
+    def __init__(self, screen, board, game_record, writer):
         self.screen = screen
         self.board = board
-        self.move_history = move_history
-        self.captured_pieces = captured_pieces
+        self.game_record = game_record
+        self.writer = writer
         self.running = True
         self.message = ""
+        self.width, self.height = screen.get_size()
+        self.layout_buttons()
         
-        center_x = WIDTH // 2
+    def layout_buttons(self):
+        """Place the buttons for the current window size"""
+        center_x = self.width // 2
         self.buttons = {
             'save': Button(center_x - 100, 300, 200, 50, "Save Game"),
             'return': Button(center_x - 100, 400, 200, 50, "Return to Game")
         }
+        
+    def handle_resize(self, event):
+        """Lay the menu out again after the window has been resized"""
+        self.screen = pygame.display.get_surface()
+        self.width, self.height = self.screen.get_size()
+        self.layout_buttons()
     
     def run(self):
         while self.running:
@@ -792,14 +2866,14 @@ class SaveGameMenu:
             # Draw title
             font = pygame.font.SysFont('Arial', 48, bold=True)
             title = font.render("Save Game", True, MENU_TEXT_COLOR)
-            title_rect = title.get_rect(center=(WIDTH // 2, 100))
+            title_rect = title.get_rect(center=(self.width // 2, 100))
             self.screen.blit(title, title_rect)
             
             # Draw message
             if self.message:
                 font = pygame.font.SysFont('Arial', 24)
                 msg = font.render(self.message, True, MENU_TEXT_COLOR)
-                msg_rect = msg.get_rect(center=(WIDTH // 2, 200))
+                msg_rect = msg.get_rect(center=(self.width // 2, 200))
                 self.screen.blit(msg, msg_rect)
             
             # Draw buttons
@@ -811,12 +2885,16 @@ class SaveGameMenu:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     return False
+                
+                if event.type == pygame.VIDEORESIZE:
+                    self.handle_resize(event)
+                    continue
                     
                 for button_name, button in self.buttons.items():
                     if button.handle_event(event):
                         if button_name == 'save':
-                            filename = save_game(self.board, self.move_history, self.captured_pieces)
-                            self.message = f"Game saved as: {filename}"
+                            save_game(self.board, self.game_record, self.writer)
+                            self.message = "Game saved to the archive"
                         elif button_name == 'return':
                             return True
 
@@ -826,26 +2904,46 @@ class LoadGameMenu:
         self.running = True
         self.selected_file = None
         self.save_files = []
+        self.labels = {}
         self.message = ""
         self.scroll_offset = 0
         self.max_files_display = 8
+        self.width, self.height = screen.get_size()
         
         self.refresh_save_files()
+        self.layout_buttons()
         
-        center_x = WIDTH // 2
+    def layout_buttons(self):
+        """Place the buttons for the current window size"""
+        center_x = self.width // 2
         self.buttons = {
-            'load': Button(center_x - 100, HEIGHT - 150, 200, 50, "Load Game"),
-            'return': Button(center_x - 100, HEIGHT - 80, 200, 50, "Return")
+            'load': Button(center_x - 100, self.height - 150, 200, 50, "Load Game"),
+            'return': Button(center_x - 100, self.height - 80, 200, 50, "Return")
         }
         
         # Add scroll buttons
-        self.buttons['scroll_up'] = Button(WIDTH - 80, 150, 60, 40, "▲", 24)
-        self.buttons['scroll_down'] = Button(WIDTH - 80, HEIGHT - 250, 60, 40, "▼", 24)
+        self.buttons['scroll_up'] = Button(self.width - 80, 150, 60, 40, "▲", 24)
+        self.buttons['scroll_down'] = Button(self.width - 80, self.height - 250, 60, 40, "▼", 24)
+        
+    def handle_resize(self, event):
+        """Lay the menu out again after the window has been resized"""
+        self.screen = pygame.display.get_surface()
+        self.width, self.height = self.screen.get_size()
+        self.layout_buttons()
     
     def refresh_save_files(self):
-        """Get all save files in the current directory"""
+        """List the archived games, then older save files in the current directory"""
+        # Only the archive index is read; a game is decoded once it is loaded
+        self.labels = {}
+        for number, (_, _, timestamp) in enumerate(GameArchive().entries()):
+            name = f"{ARCHIVE_PREFIX}{number}"
+            saved = datetime.datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
+            self.labels[name] = f"Game {number + 1} - saved {saved}"
+        archived = sorted(self.labels, key=lambda name: int(name[len(ARCHIVE_PREFIX):]), reverse=True)
+        
         self.save_files = [f for f in os.listdir('.') if f.startswith('chess_save_') and f.endswith('.json')]
         self.save_files.sort(reverse=True)  # Most recent first
+        self.save_files = archived + self.save_files
     
     def run(self):
         while self.running:
@@ -854,14 +2952,14 @@ class LoadGameMenu:
             # Draw title
             font = pygame.font.SysFont('Arial', 48, bold=True)
             title = font.render("Load Game", True, MENU_TEXT_COLOR)
-            title_rect = title.get_rect(center=(WIDTH // 2, 50))
+            title_rect = title.get_rect(center=(self.width // 2, 50))
             self.screen.blit(title, title_rect)
             
             # Draw message
             if self.message:
                 font = pygame.font.SysFont('Arial', 24)
                 msg = font.render(self.message, True, MENU_TEXT_COLOR)
-                msg_rect = msg.get_rect(center=(WIDTH // 2, 100))
+                msg_rect = msg.get_rect(center=(self.width // 2, 100))
                 self.screen.blit(msg, msg_rect)
             
             # Draw save files list
@@ -877,14 +2975,14 @@ class LoadGameMenu:
             visible_files = self.save_files[self.scroll_offset:self.scroll_offset + self.max_files_display]
             for i, file in enumerate(visible_files):
                 y_pos = start_y + i * file_height
-                rect = pygame.Rect(50, y_pos, WIDTH - 180, file_height)
+                rect = pygame.Rect(50, y_pos, self.width - 180, file_height)
                 
                 # Highlight selected file
                 if file == self.selected_file:
                     pygame.draw.rect(self.screen, MENU_BUTTON_HOVER, rect)
                 
                 pygame.draw.rect(self.screen, MENU_TEXT_COLOR, rect, 1)
-                text = font.render(file, True, MENU_TEXT_COLOR)
+                text = font.render(self.labels.get(file, file), True, MENU_TEXT_COLOR)
                 self.screen.blit(text, (rect.x + 10, rect.y + 5))
             
             # Draw buttons
@@ -897,10 +2995,14 @@ class LoadGameMenu:
                 if event.type == pygame.QUIT:
                     return None
                 
+                if event.type == pygame.VIDEORESIZE:
+                    self.handle_resize(event)
+                    continue
+                
                 if event.type == pygame.MOUSEBUTTONDOWN:
                     # Check if a file was clicked
                     mouse_pos = pygame.mouse.get_pos()
-                    if 50 <= mouse_pos[0] <= WIDTH - 180:
+                    if 50 <= mouse_pos[0] <= self.width - 180:
                         for i, file in enumerate(visible_files):
                             y_pos = start_y + i * file_height
                             if y_pos <= mouse_pos[1] <= y_pos + file_height:
@@ -925,39 +3027,151 @@ class LoadGameMenu:
                             if self.scroll_offset + self.max_files_display < len(self.save_files):
                                 self.scroll_offset += 1
 
-def main():
+def start_recording(game):
+    """Seed the RNG and attach an input recorder to the game"""
+    seed = random.randrange(2 ** 32)
+    random.seed(seed)
+    game.recorder = InputRecorder(game, seed)
+
+def finish_recording(game):
+    """Save the game's recording, if it has one"""
+    if game.recorder:
+        filename = game.recorder.save(game.board)
+        print(f"Session recorded to {filename}")
+
+def replay_recording(filename, max_frame_ms=None):
+    """Replay a recorded session headlessly and report per-frame timings.
+    
+    Returns a process exit code: non-zero if the replay diverged from the
+    recording or its 95th percentile frame time exceeded max_frame_ms.
+    """
+    with open(filename, 'r') as f:
+        recording = json.load(f)
+    meta = recording['meta']
+    
+    # Run without a window, whatever the display
+    pygame.display.quit()
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    pygame.display.init()
+    pygame.display.set_mode(tuple(meta['window']), pygame.RESIZABLE)
+    
+    random.seed(meta['seed'])
+    time_control = meta.get('time_control')
+    game = ChessGame(meta['theme'], meta['difficulty'], tuple(time_control) if time_control else None,
+                     replay=ReplayDriver(recording))
+    if 'record' in meta:
+        game.game_record = GameRecord.from_dict(meta['record'])
+        game.board = game.game_record.board()
+    else:
+        game.board = chess.Board(meta['fen'])
+    game.player_turn = game.board.turn == chess.WHITE
+    game.run()
+    
+    times = sorted(game.frame_times)
+    if not times:
+        print("Recording has no frames")
+        return 1
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    print(f"Frames: {len(times)}")
+    print(f"Frame time (ms): mean {statistics.mean(times):.2f}, median {statistics.median(times):.2f}, "
+          f"p95 {p95:.2f}, max {times[-1]:.2f}")
+    
+    exit_code = 0
+    if game.board.fen() != meta['final_fen']:
+        print(f"Replay diverged: expected {meta['final_fen']}, got {game.board.fen()}")
+        exit_code = 1
+    if max_frame_ms is not None and p95 > max_frame_ms:
+        print(f"p95 frame time {p95:.2f} ms exceeds the {max_frame_ms:.2f} ms budget")
+        exit_code = 1
+    return exit_code
+
+def main(record=False):
     # Make sure the necessary directories exist
     Path("chess_pieces/classic").mkdir(parents=True, exist_ok=True)
     Path("chess_pieces/modern").mkdir(parents=True, exist_ok=True)
     
-    screen = pygame.display.set_mode((WIDTH, HEIGHT))
+    screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.RESIZABLE)
     pygame.display.set_caption("Chess Game")
+    archive_writer = ArchiveWriter()
     
     while True:
+        # The game may have resized the window
+        screen = pygame.display.get_surface()
         menu = StartupMenu(screen)
-        action, theme, difficulty = menu.run()
+        action, theme, difficulty, time_control = menu.run()
         
         if action == 'quit':
             break
         elif action == 'new_game':
-            game = ChessGame(theme, difficulty)
+            game = ChessGame(theme, difficulty, time_control, archive_writer=archive_writer)
+            if record:
+                start_recording(game)
             game.run()
+            finish_recording(game)
+        elif action == 'puzzles':
+            puzzles = PuzzleIndex()
+            if not len(puzzles):
+                print("No puzzles found. Mine some with --mine-puzzles first.")
+                continue
+            try:
+                puzzle = puzzles.get(random.randrange(len(puzzles)))
+                game = ChessGame(theme, difficulty, puzzle=puzzle)
+                game.run()
+            except Exception as e:
+                print(f"Error loading puzzle: {e}")
         elif action == 'load_game':
+            # List the games saved moments ago too
+            archive_writer.wait()
             load_menu = LoadGameMenu(screen)
             save_file = load_menu.run()
             if save_file:
                 try:
-                    board, move_history, captured_pieces = load_game(save_file)
-                    game = ChessGame(theme, difficulty)
+                    board, game_record = load_game(save_file)
+                    game = ChessGame(theme, difficulty, time_control, archive_writer=archive_writer)
                     game.board = board
-                    game.move_history = move_history
-                    game.captured_pieces = captured_pieces
+                    game.game_record = game_record
                     game.player_turn = board.turn == chess.WHITE
+                    if record:
+                        start_recording(game)
                     game.run()
+                    finish_recording(game)
                 except Exception as e:
                     print(f"Error loading game: {e}")
     
+    archive_writer.close()
     pygame.quit()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Chess Game")
+    parser.add_argument('--record', action='store_true',
+                        help="record input and engine replies of each game for replay")
+    parser.add_argument('--replay', metavar='FILE',
+                        help="replay a recorded session headlessly and report frame timings")
+    parser.add_argument('--max-frame-ms', type=float, default=None,
+                        help="with --replay, fail if the 95th percentile frame time exceeds this")
+    parser.add_argument('--mine-puzzles', nargs='*', metavar='GAME_FILE',
+                        help="mine puzzles from saved games and PGNs (default: all in the current directory)")
+    parser.add_argument('--perft', type=int, metavar='DEPTH',
+                        help="run the perft suite to DEPTH and report move generation nodes/second")
+    parser.add_argument('--tournament', nargs='?', const='', metavar='BOOK',
+                        help="calibrate the difficulty presets in engine matches, with openings "
+                             "from a polyglot BOOK if given, and write an Elo table")
+    parser.add_argument('--games', type=int, default=TOURNAMENT_MAX_GAMES,
+                        help="with --tournament, the most games of any one match")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="number of worker processes (default: one per CPU)")
+    parser.add_argument('--depth', type=int, default=PUZZLE_DEPTH,
+                        help="engine depth used to verify puzzles")
+    args = parser.parse_args()
+    
+    if args.perft:
+        sys.exit(run_perft_suite(args.perft, args.workers))
+    if args.tournament is not None:
+        run_tournament(args.tournament or None, args.workers, args.games)
+        sys.exit(0)
+    if args.mine_puzzles is not None:
+        mine_puzzles(args.mine_puzzles, args.workers, args.depth)
+        sys.exit(0)
+    if args.replay:
+        sys.exit(replay_recording(args.replay, args.max_frame_ms))
+    main(record=args.record)